@@ -0,0 +1,223 @@
+"""Compare the whole-file conversion path with the streaming converter.
+
+Run with:  python benchmarks.py --rows 1000000
+Cleaning:  python benchmarks.py --clean --rows 10000000
+Uploads:   python benchmarks.py --upload 1024 2048 4096
+"""
+import argparse
+import io
+import multiprocessing
+import os
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import benchsuite
+from datasweeper import cleaning, converter, profiling
+
+# Input formats of the upload benchmark
+UPLOAD_FORMATS = ["CSV", "JSON", "NDJSON", "Parquet"]
+
+# Every cleaning step, as used by the cleaning benchmark
+CLEANING_OPTIONS = {
+    "trim": True, "case": "title", "dedup": ["id"], "nulls": "fill", "fill_value": "0",
+    "clip": cleaning.DEFAULT_CLIP_QUANTILE, "clip_columns": ["value"],
+}
+
+
+def make_csv(path, rows, seed=0):
+    """Write a synthetic CSV with numeric and string columns."""
+    rng = np.random.default_rng(seed)
+    for start in range(0, rows, converter.DEFAULT_CHUNKSIZE):
+        n = min(converter.DEFAULT_CHUNKSIZE, rows - start)
+        df = pd.DataFrame({
+            "id": np.arange(start, start + n),
+            "value": rng.random(n),
+            "count": rng.integers(0, 1000, n),
+            "city": rng.choice(["Karachi", "Lahore", "Islamabad", "Quetta"], n),
+        })
+        df.to_csv(path, mode="a", index=False, header=start == 0)
+
+
+def make_dirty_csv(path, rows, seed=0):
+    """Write a synthetic CSV with padded, mixed-case text, missing values and repeated ids."""
+    rng = np.random.default_rng(seed)
+    cities = np.array([" karachi", "LAHORE ", "Islamabad", "  quetta  ", None], dtype=object)
+    for start in range(0, rows, converter.DEFAULT_CHUNKSIZE):
+        n = min(converter.DEFAULT_CHUNKSIZE, rows - start)
+        value = rng.standard_normal(n)
+        value[rng.random(n) < 0.01] *= 1000
+        df = pd.DataFrame({
+            # About one id in ten repeats an earlier one
+            "id": np.where(rng.random(n) < 0.1, rng.integers(0, start + n, n), np.arange(start, start + n)),
+            "value": value,
+            "count": pd.array(np.where(rng.random(n) < 0.05, None, rng.integers(0, 1000, n)), dtype="Int64"),
+            "city": rng.choice(cities, n),
+        })
+        df.to_csv(path, mode="a", index=False, header=start == 0)
+
+
+def clean_whole_file(path):
+    """Load everything, clean it in one go and serialize the result."""
+    df = cleaning.clean(pd.read_csv(path), **CLEANING_OPTIONS)
+    return df.to_csv(index=False)
+
+
+def clean_streaming(path):
+    output = converter.stream_convert(path, "CSV", "CSV", cleaning_options=CLEANING_OPTIONS)
+    output.close()
+
+
+def whole_file(path, output_format):
+    """The original path: parse everything, then build the whole output string."""
+    df = pd.read_csv(path)
+    if output_format == "JSON":
+        return df.to_json(orient="records")
+    if output_format == "XML":
+        return df.to_xml(index=False)
+    if output_format == "Excel":
+        buffer = io.BytesIO()
+        df.to_excel(buffer, index=False)
+        buffer.seek(0)
+        return buffer.read()
+    if output_format == "Parquet":
+        return df.to_parquet(index=False)
+    if output_format == "Feather":
+        buffer = io.BytesIO()
+        df.to_feather(buffer)
+        return buffer.getvalue()
+    if output_format == "NDJSON":
+        return df.to_json(orient="records", lines=True)
+    return df.to_csv(sep=converter.DELIMITERS[output_format], index=False)
+
+
+def streaming(path, output_format):
+    output = converter.stream_convert(path, "CSV", output_format)
+    output.close()
+
+
+def reread(path, output_format):
+    """Convert the CSV once, then time reading the converted file back."""
+    with converter.stream_convert(path, "CSV", output_format) as converted:
+        start = time.perf_counter()
+        for _ in converter.read_chunks(converted, output_format):
+            pass
+        return time.perf_counter() - start
+
+
+def make_upload(path, input_format, size):
+    """Write synthetic data in `input_format` until the file reaches `size` bytes."""
+    with open(path, "wb") as output:
+        def chunks():
+            for chunk in benchsuite.make_chunks("narrow-string", 10 ** 12):
+                if output.tell() >= size:
+                    return
+                yield chunk
+        converter.write_chunks(chunks(), input_format, output)
+
+
+def parse_whole(source, input_format):
+    """How the web app used to parse an upload: one reader call over the whole file."""
+    if input_format == "CSV":
+        return pd.read_csv(source)
+    if input_format == "Parquet":
+        return pd.read_parquet(source)
+    return pd.read_json(source, lines=input_format == "NDJSON")
+
+
+def parse_chunked(source, input_format):
+    """How the web app parses an upload now: chunk by chunk, then concatenated."""
+    return pd.concat(converter.read_chunks(source, input_format), ignore_index=True)
+
+
+def parse_upload(path, input_format, parse, spill):
+    """Parse the file the way the web app sees an upload, returning the peak RSS above it.
+
+    Streamlit keeps the upload in memory, so the file is loaded first either
+    way; with `spill`, the reader works over a file handle instead of it.
+    """
+    with open(path, "rb") as file:
+        upload = io.BytesIO(file.read())
+    source = open(path, "rb") if spill else upload
+    profiling.reset_peak_rss()
+    baseline = profiling.peak_rss()
+    parse(source, input_format)
+    return profiling.peak_rss() - baseline
+
+
+def measure_upload(path, input_format, parse, spill=False):
+    """Run parse_upload() in a fresh process, so every peak is measured on its own."""
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+        try:
+            return pool.submit(parse_upload, path, input_format, parse, spill).result()
+        except Exception as e:
+            # Most likely killed for running out of memory
+            return f"{type(e).__name__}"
+
+
+def measure(func, *args):
+    """Return (seconds, peak traced bytes) for one call of `func`."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    func(*args)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--clean", action="store_true", help="benchmark the cleaning stage instead")
+    parser.add_argument("--upload", type=int, nargs="+", metavar="MB",
+                        help="benchmark the peak memory of parsing uploads of these sizes instead")
+    args = parser.parse_args()
+
+    if args.upload:
+        runs = (("whole", parse_whole, False), ("chunked", parse_chunked, False), ("spilled", parse_chunked, True))
+        for size in args.upload:
+            for input_format in UPLOAD_FORMATS:
+                with tempfile.NamedTemporaryFile() as src:
+                    make_upload(src.name, input_format, size * 1024 ** 2)
+                    peaks = []
+                    for name, parse, spill in runs:
+                        peak = measure_upload(src.name, input_format, parse, spill)
+                        peaks.append(f"{name} {peak / 1024 ** 2:8.1f} MB" if isinstance(peak, int) else
+                                     f"{name} {peak:>11}")
+                    print(f"{size:6,} MB {input_format:<7} peak above upload: {'  '.join(peaks)}", flush=True)
+        return
+
+    if args.clean:
+        with tempfile.NamedTemporaryFile(suffix=".csv") as src:
+            make_dirty_csv(src.name, args.rows)
+            print(f"{args.rows:,} rows, {os.path.getsize(src.name) / 1e6:.1f} MB input")
+            for name, func in (("whole-file", clean_whole_file), ("streaming", clean_streaming)):
+                # tracemalloc slows pandas down, so time an untraced run separately
+                start = time.perf_counter()
+                func(src.name)
+                elapsed = time.perf_counter() - start
+                peak = measure(func, src.name)[1]
+                print(f"clean CSV -> CSV {name:<10} {elapsed:7.2f}s  peak {peak / 1e6:8.1f} MB  "
+                      f"{args.rows / elapsed:12,.0f} rows/s")
+        return
+
+    with tempfile.NamedTemporaryFile(suffix=".csv") as src:
+        make_csv(src.name, args.rows)
+        print(f"{args.rows:,} rows, {os.path.getsize(src.name) / 1e6:.1f} MB input")
+        for output_format in converter.STREAM_OUTPUT_FORMATS:
+            for name, func in (("whole-file", whole_file), ("streaming", streaming)):
+                elapsed, peak = measure(func, src.name, output_format)
+                print(f"CSV -> {output_format:<7} {name:<10} {elapsed:7.2f}s  peak {peak / 1e6:8.1f} MB")
+
+        for input_format in ["CSV", "Parquet", "Feather", "NDJSON"]:
+            print(f"re-read {input_format:<7} {reread(src.name, input_format):7.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""Benchmark every input -> output format pair on synthetic data.
+
+Datasets of several shapes (narrow/wide, numeric/string heavy) and sizes are
+generated once in every input format, then each pair is converted in a fresh
+process so its peak RSS is measured on its own. Results are written as JSON,
+and a previous report can be passed with --baseline to flag regressions:
+
+    python benchsuite.py --sizes 10000 100000 --report before.json
+    pip install --upgrade pandas pyarrow
+    python benchsuite.py --sizes 10000 100000 --report after.json --baseline before.json
+
+The full matrix (4 shapes x 4 sizes up to 10M rows x 64 pairs) takes hours
+and tens of GB of disk; narrow it with --shapes, --sizes, --inputs and
+--outputs.
+"""
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from datasweeper import converter, profiling, sqlengine
+
+SIZES = [10_000, 100_000, 1_000_000, 10_000_000]
+
+# Shape name: (number of numeric columns, number of string columns)
+SHAPES = {
+    "narrow-numeric": (4, 1),
+    "narrow-string": (1, 4),
+    "wide-numeric": (45, 5),
+    "wide-string": (5, 45),
+}
+
+WORDS = np.array(["alpha", "bravo", "charlie", "delta", "echo", "foxtrot", "golf", "hotel", "india", "juliett"])
+
+# Seconds before a single conversion is abandoned
+DEFAULT_TIMEOUT = 1800
+
+# A pair counts as a regression when it is this much slower than the baseline
+DEFAULT_TOLERANCE = 0.25
+
+
+def make_chunks(shape, rows, chunksize=converter.DEFAULT_CHUNKSIZE, seed=0):
+    """Yield the synthetic dataset `shape` x `rows` as DataFrame chunks."""
+    numeric, strings = SHAPES[shape]
+    for start in range(0, rows, chunksize):
+        # Seeded per chunk, so every input format gets exactly the same data
+        rng = np.random.default_rng([seed, start])
+        n = min(chunksize, rows - start)
+        data = {"id": np.arange(start, start + n)}
+        for i in range(numeric - 1):
+            data[f"n{i}"] = rng.random(n) if i % 2 else rng.integers(0, 1_000_000, n)
+        for i in range(strings):
+            data[f"s{i}"] = np.char.add(rng.choice(WORDS, n), rng.integers(0, 1000, n).astype(str))
+        yield pd.DataFrame(data)
+
+
+def make_inputs(workdir, shape, rows, input_formats):
+    """Write the dataset in every input format, returning {format: path}."""
+    paths = {}
+    for input_format in input_formats:
+        if input_format == "Excel" and rows >= converter.EXCEL_MAX_ROWS:
+            # Only the first sheet is read back, so larger inputs would lose rows
+            continue
+        path = os.path.join(workdir, f"{shape}-{rows}.{converter.OUTPUT_TYPES[input_format][1]}")
+        with open(path, "wb") as output:
+            converter.write_chunks(make_chunks(shape, rows), input_format, output)
+        paths[input_format] = path
+    return paths
+
+
+def run_one(connection, src, dst, input_format, output_format, engine):
+    """Convert one file and send the measurements back. Runs in a fresh process."""
+    try:
+        baseline = profiling.peak_rss()
+        start = time.perf_counter()
+        if engine == "duckdb":
+            rows = sqlengine.convert(src, dst, input_format, output_format)
+        else:
+            rows = converter.convert(src, dst, input_format, output_format)
+        seconds = time.perf_counter() - start
+        connection.send({
+            "status": "ok", "rows": rows, "seconds": seconds, "rows_per_second": rows / seconds,
+            "output_bytes": os.path.getsize(dst), "peak_rss_bytes": profiling.peak_rss(),
+            "baseline_rss_bytes": baseline,
+        })
+    except Exception as e:
+        connection.send({"status": "error", "error": f"{type(e).__name__}: {e}"})
+    finally:
+        connection.close()
+
+
+def measure(src, dst, input_format, output_format, engine="pandas", timeout=DEFAULT_TIMEOUT):
+    """Run one conversion in a spawned process and return its measurements."""
+    context = multiprocessing.get_context("spawn")
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=run_one, args=(sender, src, dst, input_format, output_format, engine))
+    process.start()
+    sender.close()
+    try:
+        if receiver.poll(timeout):
+            return receiver.recv()
+        return {"status": "timeout"}
+    except EOFError:
+        # Killed without reporting back, most likely out of memory
+        return {"status": "crashed", "exit_code": process.exitcode}
+    finally:
+        if process.is_alive():
+            process.terminate()
+        process.join()
+        if os.path.exists(dst):
+            os.remove(dst)
+
+
+def environment():
+    """Versions and machine details the results depend on."""
+    import pyarrow
+
+    versions = {"python": platform.python_version(), "pandas": pd.__version__, "numpy": np.__version__,
+                "pyarrow": pyarrow.__version__}
+    if sqlengine.available():
+        versions["duckdb"] = sqlengine._duckdb().__version__
+    return {
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "versions": versions,
+    }
+
+
+def result_key(result):
+    return (result["engine"], result["shape"], result["rows"], result["input_format"], result["output_format"])
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Results that got slower than `baseline` by more than `tolerance`, or stopped working."""
+    previous = {result_key(result): result for result in baseline["results"]}
+    regressions = []
+    for result in results:
+        before = previous.get(result_key(result))
+        if before is None or before["status"] != "ok":
+            continue
+        if result["status"] != "ok":
+            regressions.append({**result, "reason": result["status"]})
+        elif result["seconds"] > before["seconds"] * (1 + tolerance):
+            regressions.append({**result, "reason": f"{result['seconds'] / before['seconds']:.2f}x slower"})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--shapes", nargs="+", choices=list(SHAPES), default=list(SHAPES))
+    parser.add_argument("--inputs", nargs="+", choices=converter.INPUT_FORMATS, default=converter.INPUT_FORMATS)
+    parser.add_argument("--outputs", nargs="+", choices=converter.OUTPUT_FORMATS, default=converter.OUTPUT_FORMATS)
+    parser.add_argument("--engine", choices=["pandas", "duckdb"], default="pandas")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per pair, the fastest is reported")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help="seconds per conversion")
+    parser.add_argument("--report", default="benchmark-report.json", help="JSON report to write")
+    parser.add_argument("--baseline", help="earlier report to compare against")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="slowdown counted as a regression (default: %(default)s)")
+    args = parser.parse_args()
+
+    inputs = args.inputs
+    if args.engine == "duckdb":
+        inputs = [input_format for input_format in inputs if sqlengine.supports(input_format)]
+
+    results = []
+    for shape in args.shapes:
+        for rows in args.sizes:
+            with tempfile.TemporaryDirectory(prefix="datasweeper-bench-") as workdir:
+                paths = make_inputs(workdir, shape, rows, inputs)
+                for input_format, src in paths.items():
+                    for output_format in args.outputs:
+                        dst = os.path.join(workdir, "output")
+                        result = {
+                            "engine": args.engine, "shape": shape, "rows": rows,
+                            "columns": sum(SHAPES[shape]), "input_format": input_format,
+                            "output_format": output_format, "input_bytes": os.path.getsize(src),
+                        }
+                        runs = [measure(src, dst, input_format, output_format, args.engine, args.timeout)
+                                for _ in range(args.repeat)]
+                        measured = min(runs, key=lambda run: run.get("seconds", float("inf")))
+                        # The row count written is checked against the generated one
+                        written = measured.pop("rows", None)
+                        if measured["status"] == "ok" and written != rows:
+                            measured.update(status="error", error=f"wrote {written} of {rows} rows")
+                        result.update(measured)
+                        results.append(result)
+                        if result["status"] == "ok":
+                            print(f"{shape:<15} {rows:>10,} {input_format:>7} -> {output_format:<7} "
+                                  f"{result['seconds']:8.2f}s {result['rows_per_second']:12,.0f} rows/s "
+                                  f"peak {result['peak_rss_bytes'] / 1024 ** 2:8.1f} MB", flush=True)
+                        else:
+                            print(f"{shape:<15} {rows:>10,} {input_format:>7} -> {output_format:<7} "
+                                  f"{result['status']}: {result.get('error', '')}", flush=True)
+
+    report = {"environment": environment(), "results": results}
+    if args.baseline:
+        with open(args.baseline) as file:
+            report["regressions"] = compare(results, json.load(file), args.tolerance)
+    with open(args.report, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"Report written to {args.report}")
+
+    for regression in report.get("regressions", []):
+        print(f"REGRESSION {regression['shape']} {regression['rows']:,} {regression['input_format']} -> "
+              f"{regression['output_format']}: {regression['reason']}")
+    return 1 if report.get("regressions") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
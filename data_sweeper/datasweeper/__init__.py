@@ -0,0 +1,5 @@
+"""DataSweeper: convert between CSV, Excel, JSON, XML, TXT, Parquet, Feather and NDJSON files.
+
+converter holds the streaming readers and writers, cli the datasweeper
+command; main.py, the Streamlit app, imports the modules from here.
+"""
@@ -0,0 +1,6 @@
+"""Run the datasweeper command as python -m datasweeper."""
+import sys
+
+from .cli import main
+
+sys.exit(main())
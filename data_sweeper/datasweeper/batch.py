@@ -0,0 +1,124 @@
+"""Batch conversion of many files across a process pool.
+
+Uploads (or the members of uploaded zip archives) are spilled to a temporary
+directory, converted in parallel by worker processes with converter.convert(),
+and collected into a single zip archive as each one finishes.
+"""
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import PurePosixPath
+
+from . import compression, converter
+
+
+def convert_path(src_path, dst_path, input_format, output_format, chunksize, columns=None, compress=None,
+                 cleaning_options=None, where=None, flatten_options=None):
+    """Convert one file on disk to another, returning (rows, seconds, bytes read, bytes written).
+
+    Runs in a worker.
+    """
+    start = time.perf_counter()
+    stats = {}
+    rows = converter.convert(
+        src_path, dst_path, input_format, output_format, chunksize, columns, compress,
+        cleaning_options=cleaning_options, where=where, stats=stats, flatten_options=flatten_options
+    )
+    return rows, time.perf_counter() - start, stats["bytes_read"], stats["bytes_written"]
+
+
+def expand_uploads(files, workdir):
+    """Copy (name, binary file) pairs into `workdir`, unpacking zip archives.
+
+    Returns a list of (name, path) pairs, one per file to convert.
+    """
+    inputs = []
+    for name, source in files:
+        source.seek(0)
+        if name.lower().endswith(".zip"):
+            with zipfile.ZipFile(source) as archive:
+                for member in archive.infolist():
+                    if member.is_dir():
+                        continue
+                    path = os.path.join(workdir, f"in-{len(inputs)}")
+                    with archive.open(member) as src, open(path, "wb") as dst:
+                        shutil.copyfileobj(src, dst)
+                    inputs.append((member.filename, path))
+        else:
+            path = os.path.join(workdir, f"in-{len(inputs)}")
+            with open(path, "wb") as dst:
+                shutil.copyfileobj(source, dst)
+            inputs.append((name, path))
+    return inputs
+
+
+def output_name(name, output_format, used, compress=None):
+    """Name of the converted file inside the result archive, kept unique."""
+    ext = converter.OUTPUT_TYPES[output_format][1]
+    if compress:
+        ext += "." + compression.EXTENSIONS[compress]
+    stem = str(PurePosixPath(compression.strip_extension(name)[0]).with_suffix(""))
+    candidate = f"{stem}.{ext}"
+    counter = 1
+    while candidate in used:
+        counter += 1
+        candidate = f"{stem}-{counter}.{ext}"
+    used.add(candidate)
+    return candidate
+
+
+def convert_batch(files, input_format, output_format, chunksize=converter.DEFAULT_CHUNKSIZE,
+                  columns=None, compress=None, max_workers=None, progress=None, cleaning_options=None,
+                  where=None, flatten_options=None):
+    """Convert many files in parallel and zip the results.
+
+    `files` is an iterable of (name, binary file) pairs. With `input_format`
+    None every file's format is sniffed from its content. `progress`, if given,
+    is called as progress(done, total, result) after every file. Returns the
+    zip archive as a spooled file rewound to the start, and a list of result
+    dicts with the file name, rows, seconds, bytes read and written, and
+    error (None on success). `cleaning_options`, the `where` filter and
+    `flatten_options` are applied to every file.
+    """
+    archive_file = tempfile.SpooledTemporaryFile(max_size=converter.SPOOL_MAX_SIZE)
+    results = []
+    used_names = set()
+
+    with tempfile.TemporaryDirectory(prefix="datasweeper-") as workdir:
+        inputs = expand_uploads(files, workdir)
+        # Spawned workers only import this module, never the Streamlit script
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=context) as pool, \
+                zipfile.ZipFile(archive_file, "w", zipfile.ZIP_DEFLATED) as archive:
+            futures = {}
+            for name, path in inputs:
+                dst_path = path + ".out"
+                future = pool.submit(
+                    convert_path, path, dst_path, input_format, output_format, chunksize, columns, compress,
+                    cleaning_options, where, flatten_options
+                )
+                futures[future] = (name, dst_path)
+
+            for future in as_completed(futures):
+                name, dst_path = futures[future]
+                result = {"file": name, "rows": 0, "seconds": 0.0, "bytes_read": 0, "bytes_written": 0,
+                          "error": None}
+                try:
+                    rows, seconds, bytes_read, bytes_written = future.result()
+                    result.update(rows=rows, seconds=seconds, bytes_read=bytes_read, bytes_written=bytes_written)
+                    archive.write(dst_path, output_name(name, output_format, used_names, compress))
+                except Exception as e:
+                    result["error"] = str(e)
+                finally:
+                    if os.path.exists(dst_path):
+                        os.remove(dst_path)
+                results.append(result)
+                if progress is not None:
+                    progress(len(results), len(inputs), result)
+
+    archive_file.seek(0)
+    return archive_file, results
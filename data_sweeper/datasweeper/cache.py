@@ -0,0 +1,68 @@
+"""Cache of parsed uploads shared across Streamlit reruns.
+
+Entries are keyed by (content hash, input format, parse options) and
+evicted least-recently-used first once their total size passes a limit.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Total DataFrame memory kept in the cache
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+def content_hash(source, block_size=1024 * 1024):
+    """Return a digest of a seekable binary file's content, leaving it rewound."""
+    digest = hashlib.blake2b(digest_size=16)
+    source.seek(0)
+    for block in iter(lambda: source.read(block_size), b""):
+        digest.update(block)
+    source.seek(0)
+    return digest.hexdigest()
+
+
+class ParseCache:
+    """LRU cache of parsed DataFrames bounded by their total memory footprint.
+
+    Cached DataFrames are shared between reruns, so callers must not modify
+    them in place.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        # Every Streamlit session runs its script on its own thread
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_or_parse(self, key, parse):
+        """Return the DataFrame cached under `key`, calling `parse()` on a miss."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+
+        df = parse()
+        size = int(df.memory_usage(deep=True).sum())
+
+        with self._lock:
+            self.misses += 1
+            if size > self.max_bytes or key in self._entries:
+                return df
+            self._entries[key] = (df, size)
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.total_bytes -= evicted_size
+        return df
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
@@ -0,0 +1,135 @@
+"""Optional cleaning stage between reading and writing.
+
+Every step is a vectorized pandas/NumPy operation on a whole DataFrame, so
+the same code cleans a fully loaded upload or each chunk of a streamed one.
+Steps that look beyond a single chunk (de-duplication and outlier bounds)
+keep their state in a dict that is carried from one chunk to the next.
+"""
+import numpy as np
+import pandas as pd
+from pandas.api import types
+
+from .formats import CASES, DEFAULT_CLIP_QUANTILE, NULL_ACTIONS
+
+
+def is_text(series):
+    return types.is_object_dtype(series) or types.is_string_dtype(series)
+
+
+def apply_text(series, method):
+    """Apply a pandas .str method to the strings of a column, leaving other values alone."""
+    result = getattr(series.str, method)()
+    # .str turns non-string values of mixed object columns into NaN
+    return result.where(result.notna(), series)
+
+
+def fill_nulls(df, fill_value):
+    """Fill missing text with `fill_value`, and missing numbers if it is numeric."""
+    number = pd.to_numeric(pd.Series([fill_value]), errors="coerce").iloc[0]
+    values = {}
+    for column in df.columns:
+        series = df[column]
+        if is_text(series):
+            values[column] = fill_value
+        elif types.is_numeric_dtype(series) and not types.is_bool_dtype(series) and pd.notna(number):
+            values[column] = number
+    return df.fillna(values)
+
+
+def drop_duplicates(df, keys, state):
+    """Drop rows whose keys were already seen in this or an earlier chunk.
+
+    Keys are reduced to 64-bit hashes; the hashes seen so far are kept sorted
+    in state["seen"], so membership is a binary search instead of a Python
+    set lookup per row.
+    """
+    hashes = pd.util.hash_pandas_object(df[keys], index=False).to_numpy()
+    seen = state.get("seen")
+    keep = ~pd.Series(hashes).duplicated().to_numpy()
+    if seen is not None and len(seen):
+        positions = np.searchsorted(seen, hashes).clip(max=len(seen) - 1)
+        keep &= seen[positions] != hashes
+    new = np.sort(hashes[keep])
+    # The new hashes are unique and unseen, so a linear merge keeps `seen` sorted
+    state["seen"] = new if seen is None else np.insert(seen, np.searchsorted(seen, new), new)
+    return df[keep]
+
+
+def clip_bounds(df, quantile, columns=None):
+    """Per-column (lower, upper) quantile bounds of the numeric `columns` of `df`."""
+    numeric = df[columns] if columns else df
+    numeric = numeric.select_dtypes("number").select_dtypes(exclude="bool")
+    if numeric.empty:
+        return None
+    # "nearest" picks existing values, so integer columns stay integers
+    return numeric.quantile([quantile, 1 - quantile], interpolation="nearest")
+
+
+def check_columns(df, columns):
+    missing = [column for column in columns if column not in df.columns]
+    if missing:
+        raise ValueError(f"Unknown columns: {', '.join(map(str, missing))}")
+
+
+def clean(df, trim=False, case=None, dedup=None, nulls=None, fill_value="", clip=None, clip_columns=None,
+          state=None):
+    """Return a cleaned copy of `df`.
+
+    - trim: strip leading and trailing whitespace from text
+    - case: "lower", "upper" or "title" case for text
+    - nulls: "drop" rows with any missing value, or "fill" them with `fill_value`
+    - dedup: True to drop repeated rows, or a list of key columns to dedup on
+    - clip: quantile q; numbers outside the [q, 1 - q] quantiles are clipped,
+      in `clip_columns` or every numeric column
+
+    Pass the same `state` dict for every chunk of one file so duplicates are
+    found across chunks and every chunk is clipped to the same bounds, which
+    are then taken from the first chunk.
+    """
+    if state is None:
+        state = {}
+    if case is not None and case not in CASES:
+        raise ValueError(f"Unsupported case: {case}")
+    if nulls is not None and nulls not in NULL_ACTIONS:
+        raise ValueError(f"Unsupported null handling: {nulls}")
+
+    df = df.copy(deep=False)
+    if trim or case:
+        for position in range(df.shape[1]):
+            series = df.iloc[:, position]
+            if not is_text(series):
+                continue
+            if trim:
+                series = apply_text(series, "strip")
+            if case:
+                series = apply_text(series, case)
+            df.isetitem(position, series)
+
+    if nulls == "drop":
+        df = df.dropna()
+    elif nulls == "fill":
+        df = fill_nulls(df, fill_value)
+
+    if dedup:
+        keys = list(df.columns) if dedup is True else list(dedup)
+        check_columns(df, keys)
+        df = drop_duplicates(df, keys, state)
+
+    if clip:
+        if "bounds" not in state:
+            check_columns(df, clip_columns or [])
+            state["bounds"] = clip_bounds(df, clip, clip_columns)
+        bounds = state["bounds"]
+        if bounds is not None:
+            for column in bounds.columns:
+                if column in df.columns:
+                    lower, upper = bounds[column]
+                    df.isetitem(df.columns.get_loc(column), df[column].clip(lower, upper))
+    return df
+
+
+def clean_chunks(chunks, **options):
+    """Clean every DataFrame of `chunks` with clean(), sharing state across them."""
+    state = {}
+    for chunk in chunks:
+        yield clean(chunk, state=state, **options)
@@ -0,0 +1,194 @@
+"""Command-line entry point: convert files without starting Streamlit.
+
+Examples:
+    datasweeper export.csv export.parquet
+    datasweeper events.jsonl.gz events.csv.zst --columns id,timestamp
+    datasweeper export.parquet big-orders.csv --where "total > 1000 and country == 'PK'"
+    datasweeper data.txt data.xml --from TXT --to XML --chunksize 100000
+    datasweeper raw.csv clean.csv --trim --dedup email --nulls drop
+    datasweeper events.jsonl.gz events.parquet --flatten --where "user.country == 'PK'"
+    datasweeper huge.csv.gz totals.parquet --sql "SELECT city, sum(total) FROM input GROUP BY city"
+    datasweeper export.json export.parquet --profile json 2>> performance.log
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+from . import compression, filters, formats, profiling, sniff, sqlengine
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="datasweeper",
+        description="Convert between CSV, Excel, JSON, XML, TXT, Parquet, Feather and NDJSON files.",
+    )
+    parser.add_argument("src", help="file to convert")
+    parser.add_argument("dst", help="file to write")
+    parser.add_argument("--from", dest="input_format", choices=formats.INPUT_FORMATS,
+                        help="input format (default: detected from the content)")
+    parser.add_argument("--to", dest="output_format", choices=formats.OUTPUT_FORMATS,
+                        help="output format (default: guessed from the file name)")
+    parser.add_argument("--chunksize", type=int, default=formats.DEFAULT_CHUNKSIZE,
+                        help="rows read and written at a time (default: %(default)s)")
+    parser.add_argument("--columns", help="comma-separated list of columns to keep")
+    parser.add_argument("--where", help="only convert rows matching this filter, "
+                                        "e.g. \"price > 10 and city == 'Lahore'\"")
+    parser.add_argument("--flatten", type=int, nargs="?", const=0, metavar="DEPTH",
+                        help="expand nested JSON/NDJSON objects into columns, up to DEPTH levels (default: all)")
+    parser.add_argument("--flatten-separator", default=formats.DEFAULT_SEPARATOR, metavar="SEP",
+                        help="joins the keys of flattened column names (default: %(default)s)")
+    parser.add_argument("--delimiter", help="field separator of CSV/TXT input (default: detected)")
+    parser.add_argument("--encoding", help="text encoding of the input (default: detected)")
+    parser.add_argument("--compress", choices=compression.COMPRESSIONS,
+                        help="compress the output (default: guessed from the file name, "
+                             "compressed input is always detected)")
+
+    clean = parser.add_argument_group("cleaning")
+    clean.add_argument("--trim", action="store_true", help="strip whitespace around text values")
+    clean.add_argument("--case", choices=formats.CASES, help="change the case of text values")
+    clean.add_argument("--dedup", nargs="?", const="", metavar="KEYS",
+                       help="drop duplicate rows, compared on these comma-separated columns (default: all)")
+    clean.add_argument("--nulls", choices=formats.NULL_ACTIONS,
+                       help="drop rows with missing values, or fill them with --fill-value")
+    clean.add_argument("--fill-value", default="", help="value for missing cells with --nulls fill")
+    clean.add_argument("--clip", type=float, nargs="?", const=formats.DEFAULT_CLIP_QUANTILE, metavar="Q",
+                       help="clip numbers to the [Q, 1-Q] quantiles of the first chunk (default Q: %(const)s)")
+    clean.add_argument("--clip-columns", metavar="COLUMNS",
+                       help="comma-separated numeric columns to clip (default: all)")
+
+    engine = parser.add_argument_group("engine")
+    engine.add_argument("--engine", choices=formats.ENGINES, default="auto",
+                        help="conversion engine; auto uses DuckDB for inputs above --engine-threshold "
+                             "(default: %(default)s)")
+    engine.add_argument("--engine-threshold", type=float, default=formats.DUCKDB_THRESHOLD / 1024 ** 2,
+                        metavar="MB", help="input size above which auto picks DuckDB (default: %(default)s)")
+    engine.add_argument("--memory-limit", default=sqlengine.DEFAULT_MEMORY_LIMIT,
+                        help="memory DuckDB may use before spilling to disk (default: %(default)s)")
+    engine.add_argument("--sql", help="SQL query over the view \"input\" to convert instead, run by DuckDB")
+    parser.add_argument("--profile", nargs="?", const="table", choices=["table", "json"],
+                        help="print the time, rows, bytes and peak memory of every stage, as a table or as "
+                             "JSON log lines (default: table)")
+    parser.add_argument("-q", "--quiet", action="store_true", help="do not print a summary")
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    # Checked up front: with --from nothing is opened before the file sizes are taken
+    if not os.path.isfile(args.src):
+        parser.error(f"no such file: {args.src}")
+
+    input_format = args.input_format
+    delimiter, encoding = args.delimiter, args.encoding
+    if input_format is None:
+        try:
+            detected = sniff.sniff(args.src)
+        except OSError as e:
+            parser.error(str(e))
+        input_format = detected["format"] or formats.input_format_for(args.src)
+        delimiter = delimiter or detected["delimiter"]
+        encoding = encoding or detected["encoding"]
+    output_format = args.output_format or formats.output_format_for(args.dst)
+    if input_format is None:
+        parser.error(f"cannot detect the format of {args.src}, use --from")
+    if output_format is None:
+        parser.error(f"cannot guess the format of {args.dst}, use --to")
+    if os.path.exists(args.dst) and os.path.samefile(args.src, args.dst):
+        parser.error("src and dst must be different files")
+    compress = args.compress or compression.strip_extension(args.dst)[1]
+    columns = [column.strip() for column in args.columns.split(",")] if args.columns else None
+    if args.where:
+        try:
+            filters.parse_filter(args.where)
+        except ValueError as e:
+            parser.error(str(e))
+    if args.flatten is not None and args.flatten < 0:
+        parser.error("--flatten depth must not be negative")
+    flatten_options = None
+    if args.flatten is not None and input_format in formats.FLATTEN_FORMATS:
+        flatten_options = {"max_level": args.flatten or None, "sep": args.flatten_separator}
+    if args.clip is not None and not 0 < args.clip < 0.5:
+        parser.error("--clip must be between 0 and 0.5")
+    dedup = None
+    if args.dedup is not None:
+        dedup = [key.strip() for key in args.dedup.split(",") if key.strip()] or True
+    clip_columns = [column.strip() for column in args.clip_columns.split(",")] if args.clip_columns else None
+    cleaning_options = {
+        "trim": args.trim, "case": args.case, "dedup": dedup, "nulls": args.nulls,
+        "fill_value": args.fill_value, "clip": args.clip, "clip_columns": clip_columns,
+    }
+    if not any([args.trim, args.case, dedup, args.nulls, args.clip]):
+        cleaning_options = None
+
+    use_duckdb = args.engine == "duckdb"
+    if flatten_options and (args.sql or use_duckdb):
+        parser.error("--flatten needs the pandas engine")
+    if args.sql:
+        if args.engine == "pandas":
+            parser.error("--sql needs the DuckDB engine")
+        use_duckdb = True
+    elif args.engine == "auto" and not flatten_options:
+        threshold = args.engine_threshold * 1024 ** 2
+        use_duckdb = sqlengine.should_use(os.path.getsize(args.src), input_format, encoding, threshold)
+
+    start = time.perf_counter()
+    stats = {}
+    profile = None
+    if args.profile:
+        profile = profiling.Profile(input_format=input_format, output_format=output_format,
+                                    engine="duckdb" if use_duckdb else "pandas")
+    options = (args.chunksize, columns, compress, delimiter, encoding, cleaning_options, args.where, stats)
+    try:
+        if use_duckdb:
+            rows = sqlengine.convert(
+                args.src, args.dst, input_format, output_format, *options, query=args.sql,
+                memory_limit=args.memory_limit, profile=profile
+            )
+        else:
+            # pandas is only imported once the arguments are known to be valid
+            from . import converter
+
+            rows = converter.convert(
+                args.src, args.dst, input_format, output_format, *options, profile=profile,
+                flatten_options=flatten_options
+            )
+    except Exception as e:
+        print(f"datasweeper: error: {e}", file=sys.stderr)
+        return 1
+
+    if not args.quiet:
+        elapsed = time.perf_counter() - start
+        engine = "DuckDB" if use_duckdb else "pandas"
+        print(f"{input_format} -> {output_format} ({engine}): {rows:,} rows in {elapsed:.2f}s, "
+              f"read {stats['bytes_read']:,} bytes of a {os.path.getsize(args.src):,}-byte file, "
+              f"wrote {stats['bytes_written']:,} bytes", file=sys.stderr)
+    if args.profile == "json":
+        handler = logging.StreamHandler(sys.stderr)
+        profiling.logger.addHandler(handler)
+        profiling.logger.setLevel(logging.INFO)
+        profile.log()
+        profiling.logger.removeHandler(handler)
+    elif args.profile:
+        print_profile(profile)
+    return 0
+
+
+def print_profile(profile):
+    """Print the stage measurements as a table on stderr."""
+    print(f"{'stage':<10} {'seconds':>8} {'rows':>12} {'rows/s':>12} {'MB in':>9} {'MB out':>9} {'peak MB':>9}",
+          file=sys.stderr)
+    for record in profile.report():
+        cells = [f"{record['stage']:<10}", f"{record['seconds']:8.2f}"]
+        for key, width in [("rows", 12), ("rows_per_second", 12)]:
+            cells.append(f"{record[key]:>{width},.0f}" if record[key] is not None else " " * (width - 1) + "-")
+        for key in ["bytes_in", "bytes_out"]:
+            cells.append(f"{record[key] / 1024 ** 2:9.1f}" if record[key] is not None else " " * 8 + "-")
+        cells.append(f"{record['peak_rss_bytes'] / 1024 ** 2:9.1f}")
+        print(" ".join(cells), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
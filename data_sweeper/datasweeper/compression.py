@@ -0,0 +1,133 @@
+"""Transparent compression for DataSweeper inputs and outputs.
+
+Compressed inputs are recognised from their magic bytes rather than their
+file names and decompressed as a stream. Outputs can be compressed on the
+fly with any of the same codecs.
+"""
+import bz2
+import contextlib
+import gzip
+import lzma
+import os
+import shutil
+import tempfile
+
+# Codecs in the order they are offered to the user
+COMPRESSIONS = ["gzip", "bz2", "xz", "zstd"]
+
+MAGIC_BYTES = {
+    "gzip": b"\x1f\x8b",
+    "bz2": b"BZh",
+    "xz": b"\xfd7zXZ\x00",
+    "zstd": b"\x28\xb5\x2f\xfd",
+}
+
+# File extension and download MIME type of every codec
+EXTENSIONS = {"gzip": "gz", "bz2": "bz2", "xz": "xz", "zstd": "zst"}
+MIME_TYPES = {
+    "gzip": "application/gzip",
+    "bz2": "application/x-bzip2",
+    "xz": "application/x-xz",
+    "zstd": "application/zstd",
+}
+
+# Decompressed data that must be seekable stays in memory up to this size
+SPOOL_MAX_SIZE = 32 * 1024 * 1024
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError("Zstandard files need the zstandard package: pip install zstandard") from None
+    return zstandard
+
+
+def detect(source):
+    """Return the codec of a seekable binary file from its magic bytes, or None."""
+    position = source.tell()
+    head = source.read(6)
+    source.seek(position)
+    for name, magic in MAGIC_BYTES.items():
+        if head.startswith(magic):
+            return name
+    return None
+
+
+def strip_extension(name):
+    """Return (file name without a compression extension, codec or None)."""
+    for codec, ext in EXTENSIONS.items():
+        if name.lower().endswith("." + ext):
+            return name[:-len(ext) - 1], codec
+    return name, None
+
+
+@contextlib.contextmanager
+def decompressed(source, seekable=False):
+    """Yield `source` (a path or binary file) as a decompressed binary stream.
+
+    Uncompressed files are yielded unchanged. With `seekable`, compressed
+    data is first unpacked into a spooled temporary file for readers that
+    need random access (Excel, Parquet, Feather). Only handles opened here
+    are closed afterwards.
+    """
+    with contextlib.ExitStack() as stack:
+        if isinstance(source, (str, os.PathLike)):
+            source = stack.enter_context(open(source, "rb"))
+
+        codec = detect(source)
+        if codec is None:
+            yield source
+            return
+
+        if codec == "gzip":
+            stream = gzip.GzipFile(fileobj=source, mode="rb")
+        elif codec == "bz2":
+            stream = bz2.BZ2File(source, "rb")
+        elif codec == "xz":
+            stream = lzma.LZMAFile(source, "rb")
+        else:
+            stream = _zstandard().ZstdDecompressor().stream_reader(source, closefd=False)
+        stack.enter_context(stream)
+
+        if seekable:
+            spool = stack.enter_context(tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE))
+            shutil.copyfileobj(stream, spool)
+            spool.seek(0)
+            stream = spool
+        yield stream
+
+
+@contextlib.contextmanager
+def compressed(output, codec):
+    """Yield a writer that compresses into the binary file `output` with `codec`.
+
+    The compressed stream is finished on exit; `output` itself stays open.
+    """
+    if codec == "gzip":
+        stream = gzip.GzipFile(fileobj=output, mode="wb")
+    elif codec == "bz2":
+        stream = bz2.BZ2File(output, "wb")
+    elif codec == "xz":
+        stream = lzma.LZMAFile(output, "wb")
+    elif codec == "zstd":
+        stream = _zstandard().ZstdCompressor().stream_writer(output, closefd=False)
+    else:
+        raise ValueError(f"Unsupported compression: {codec}")
+    with stream:
+        yield stream
+
+
+def compress_bytes(data, codec):
+    """Compress an in-memory payload (bytes or str) with `codec`."""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    if codec == "gzip":
+        return gzip.compress(data)
+    if codec == "bz2":
+        return bz2.compress(data)
+    if codec == "xz":
+        return lzma.compress(data)
+    if codec == "zstd":
+        return _zstandard().ZstdCompressor().compress(data)
+    raise ValueError(f"Unsupported compression: {codec}")
@@ -0,0 +1,831 @@
+"""Streaming conversion helpers for DataSweeper.
+
+Readers yield the input as DataFrame chunks and writers append every chunk
+to a spooled output buffer, so peak memory follows the chunk size instead
+of the size of the uploaded file.
+"""
+import bisect
+import codecs
+import contextlib
+import io
+import json
+import shutil
+import tempfile
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape
+
+import pandas as pd
+
+from . import cleaning, compression, filters, flatten, sniff
+from .formats import (
+    ARROW_FORMATS, AUTO_DETECT, DEFAULT_CHUNKSIZE, DEFAULT_COMPRESSION, DEFAULT_SEPARATOR, DELIMITERS,
+    FLATTEN_FORMATS, INPUT_EXTENSIONS, INPUT_FORMATS, OUTPUT_FORMATS, OUTPUT_TYPES, RANDOM_ACCESS_FORMATS,
+    STREAM_INPUT_FORMATS, STREAM_OUTPUT_FORMATS, supports_streaming,
+)
+
+# Converted output stays in memory up to this size, then spills to disk
+SPOOL_MAX_SIZE = 32 * 1024 * 1024
+
+# Rows shown in the upload preview, and bytes read at a time to find them
+PREVIEW_ROWS = 5
+PREVIEW_BLOCK_SIZE = 64 * 1024
+
+# Rows a filtered preview looks through for matches, and parses at a time
+PREVIEW_SCAN_ROWS = 100_000
+PREVIEW_SCAN_CHUNKSIZE = 10_000
+
+# Bytes of a JSON array decoded at a time while splitting it into records
+JSON_BLOCK_SIZE = 1024 * 1024
+
+# A decoding error this close to the end of the buffer may just be a record cut
+# off by the end of the block, e.g. in the middle of "true" or a \uXXXX escape
+JSON_CUT_OFF_CHARACTERS = 6
+
+# Rows per Excel worksheet, including the header row
+EXCEL_MAX_ROWS = 1_048_576
+
+# Document header matching what df.to_xml() produces
+XML_HEADER = b"<?xml version='1.0' encoding='utf-8'?>\n<data>\n"
+XML_FOOTER = b"</data>"
+
+
+class CountingReader(io.RawIOBase):
+    """Read-only view of a binary file that counts the bytes read through it.
+
+    Each byte is counted once, however often it is read: format detection
+    peeks at the first bytes and rewinds, and pyarrow reads the Parquet
+    footer more than once. Ranges that were never read, such as the column
+    chunks projection skipped, are not counted.
+    """
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.bytes_read = 0
+        try:
+            self.position = raw.tell()
+        except (AttributeError, OSError):
+            self.position = 0
+        # Sorted, disjoint [start, end) byte ranges read so far
+        self._starts = []
+        self._ends = []
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def read(self, size=-1):
+        data = self.raw.read(size)
+        if data:
+            self._count(self.position, self.position + len(data))
+            self.position += len(data)
+        return data
+
+    def _count(self, start, end):
+        """Add the bytes of [start, end) that were not read before."""
+        # The first range that overlaps or touches [start, end)
+        first = bisect.bisect_left(self._ends, start)
+        last = first
+        merged_start, merged_end, covered = start, end, 0
+        while last < len(self._starts) and self._starts[last] <= end:
+            merged_start = min(merged_start, self._starts[last])
+            merged_end = max(merged_end, self._ends[last])
+            covered += self._ends[last] - self._starts[last]
+            last += 1
+        self._starts[first:last] = [merged_start]
+        self._ends[first:last] = [merged_end]
+        self.bytes_read += merged_end - merged_start - covered
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def seek(self, offset, whence=0):
+        self.position = self.raw.seek(offset, whence)
+        return self.position
+
+    def tell(self):
+        return self.position
+
+
+def read_columns(columns, conditions):
+    """Columns a reader must parse: the selected ones plus those the filter needs."""
+    if not columns:
+        return None
+    return columns + [column for column in filters.filter_columns(conditions) if column not in columns]
+
+
+def read_chunks(source, input_format, chunksize=DEFAULT_CHUNKSIZE, columns=None, delimiter=None,
+                encoding=None, where=None, flatten_options=None):
+    """Yield the input file as DataFrames of at most `chunksize` rows.
+
+    `columns` limits the result to the named columns; the columnar formats,
+    CSV/TXT and XML skip the other columns while parsing. `where` is a
+    filter expression (see filters.py); Parquet and Feather evaluate it while
+    scanning, the other formats on every parsed chunk. Excel has no chunked
+    reader and is yielded as one chunk, as are JSON documents that are not
+    an array of records.
+    Compressed input is detected from its magic bytes and unpacked on the fly.
+    `delimiter` and `encoding` override the defaults of the text formats.
+    `flatten_options` are keyword arguments for flatten.flatten(); nested
+    JSON and NDJSON objects are then expanded into columns before filtering
+    and projection, so both can name flattened columns such as "user.id".
+    """
+    if input_format not in INPUT_FORMATS:
+        raise ValueError(f"Unsupported input format: {input_format}")
+    conditions = filters.parse_filter(where) if where else []
+
+    with compression.decompressed(source, seekable=input_format in RANDOM_ACCESS_FORMATS) as source:
+        chunks = _read_chunks(
+            source, input_format, chunksize, read_columns(columns, conditions), delimiter, encoding, conditions,
+            flatten_options
+        )
+        if not conditions:
+            yield from chunks
+            return
+
+        matched = False
+        empty = None
+        for chunk in chunks:
+            if input_format not in ARROW_FORMATS:
+                chunk = filters.apply_filter(chunk, conditions)
+            if columns:
+                # Drop the columns only the filter needed
+                chunk = chunk[columns]
+            if len(chunk):
+                matched = True
+                yield chunk
+            else:
+                empty = chunk
+        if not matched and empty is not None:
+            # An empty chunk still carries the columns for a header
+            yield empty
+
+
+def _read_chunks(source, input_format, chunksize, columns, delimiter, encoding, conditions=(),
+                 flatten_options=None):
+    if input_format == "Excel":
+        yield pd.read_excel(source, usecols=columns)
+    elif input_format == "JSON":
+        chunks = read_json_chunks(source, chunksize, encoding)
+        if flatten_options is not None:
+            chunks = flatten.flatten_chunks(chunks, **flatten_options)
+        for chunk in chunks:
+            yield select_columns(chunk, columns)
+    elif input_format in ARROW_FORMATS:
+        yield from read_arrow_chunks(source, input_format, chunksize, columns, conditions)
+    elif input_format == "XML":
+        for chunk in read_xml_chunks(source, chunksize, columns):
+            yield select_columns(chunk, columns)
+    elif input_format == "NDJSON":
+        with pd.read_json(source, lines=True, chunksize=chunksize, encoding=encoding) as reader:
+            chunks = reader
+            if flatten_options is not None:
+                chunks = flatten.flatten_chunks(reader, **flatten_options)
+            for chunk in chunks:
+                yield select_columns(chunk, columns)
+    else:
+        sep = delimiter or DELIMITERS[input_format]
+        with pd.read_csv(source, sep=sep, chunksize=chunksize, usecols=columns, encoding=encoding) as reader:
+            yield from reader
+
+
+def select_columns(df, columns):
+    """`df` limited to `columns`.
+
+    XML, JSON and NDJSON records need not all carry every field, so a chunk
+    may lack a selected column altogether; it comes out empty.
+    """
+    if not columns:
+        return df
+    return df.reindex(columns=columns)
+
+
+def read_arrow_chunks(source, input_format, chunksize=DEFAULT_CHUNKSIZE, columns=None, conditions=()):
+    """Yield record batches of a Parquet or Feather (Arrow IPC) file, reading only `columns`.
+
+    With filter `conditions` the file is scanned as a dataset fragment, which
+    evaluates the filter in pyarrow and skips Parquet row groups whose
+    statistics cannot match.
+    """
+    import pyarrow as pa
+    import pyarrow.dataset
+    import pyarrow.ipc
+    import pyarrow.parquet
+
+    if conditions:
+        if input_format == "Parquet":
+            file_format = pyarrow.dataset.ParquetFileFormat()
+        else:
+            file_format = pyarrow.dataset.IpcFileFormat()
+        fragment = file_format.make_fragment(pa.PythonFile(source, mode="r"))
+        batches = fragment.to_batches(
+            columns=columns, filter=filters.arrow_expression(conditions), batch_size=chunksize
+        )
+    elif input_format == "Parquet":
+        batches = pyarrow.parquet.ParquetFile(source).iter_batches(batch_size=chunksize, columns=columns)
+    else:
+        reader = pyarrow.ipc.open_file(source)
+        batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+        if columns:
+            batches = (batch.select(columns) for batch in batches)
+
+    for batch in batches:
+        yield batch.to_pandas()
+
+
+def read_xml_chunks(source, chunksize=DEFAULT_CHUNKSIZE, columns=None):
+    """Yield the records (children of the root element) of an XML file in batches.
+
+    Each record is cleared as soon as it has been read, so only the current
+    batch is ever held in memory instead of the whole element tree. With
+    `columns`, the text of other fields is dropped as soon as they end.
+    A document without records gives one empty chunk.
+    """
+    wanted = set(columns) if columns else None
+    depth = 0
+    root = None
+    record = {}
+    records = []
+    chunks = 0
+    for event, elem in ET.iterparse(source, events=("start", "end")):
+        if event == "start":
+            if root is None:
+                root = elem
+            depth += 1
+            continue
+
+        depth -= 1
+        if depth == 2:
+            # A field of the current record
+            if wanted is None or elem.tag in wanted:
+                record[elem.tag] = elem.text
+            elem.clear()
+        elif depth == 1:
+            records.append(record)
+            record = {}
+            # Drop the finished record and detach it from the root
+            elem.clear()
+            root.clear()
+            if len(records) >= chunksize:
+                yield pd.DataFrame(records)
+                chunks += 1
+                records = []
+
+    if records or not chunks:
+        yield pd.DataFrame(records)
+
+
+def preview(source, input_format, rows=PREVIEW_ROWS, columns=None, delimiter=None, encoding=None, where=None,
+            flatten_options=None, stats=None):
+    """Parse only the first `rows` rows of the input, leaving `source` rewound.
+
+    With a `where` filter, chunks are read until enough matching rows are
+    found, but no further than the first PREVIEW_SCAN_ROWS rows, so a filter
+    that rarely matches does not parse the whole file. `stats` then receives
+    the "rows_scanned" and whether the scan was "complete".
+    """
+    try:
+        if where:
+            conditions = filters.parse_filter(where)
+            chunks = read_chunks(
+                source, input_format, PREVIEW_SCAN_CHUNKSIZE, read_columns(columns, conditions), delimiter,
+                encoding, flatten_options=flatten_options
+            )
+            found = []
+            empty = None
+            matched = scanned = 0
+            complete = True
+            for chunk in chunks:
+                scanned += len(chunk)
+                chunk = filters.apply_filter(chunk, conditions)
+                if columns:
+                    chunk = chunk[columns]
+                if len(chunk):
+                    found.append(chunk)
+                    matched += len(chunk)
+                else:
+                    empty = chunk
+                if matched >= rows or scanned >= PREVIEW_SCAN_ROWS:
+                    complete = False
+                    break
+            chunks.close()
+            if found:
+                df = pd.concat(found)
+            else:
+                df = empty if empty is not None else pd.DataFrame(columns=columns)
+            if stats is not None:
+                stats.update(rows_scanned=scanned, complete=complete)
+        elif input_format in ["XML", "Parquet", "Feather"]:
+            # These readers stop after their first batch
+            chunks = read_chunks(source, input_format, rows, columns)
+            df = next(chunks, pd.DataFrame())
+            chunks.close()
+        else:
+            with compression.decompressed(source, seekable=input_format == "Excel") as stream:
+                if input_format in ["CSV", "TXT"]:
+                    sep = delimiter or DELIMITERS[input_format]
+                    df = pd.read_csv(stream, sep=sep, nrows=rows, usecols=columns, encoding=encoding)
+                elif input_format == "Excel":
+                    df = pd.read_excel(stream, nrows=rows, usecols=columns)
+                elif input_format == "NDJSON":
+                    df = pd.read_json(stream, lines=True, nrows=rows, encoding=encoding)
+                else:
+                    # Stops after the first `rows` records, unless the document is not an array
+                    chunks = read_json_chunks(stream, rows, encoding, PREVIEW_BLOCK_SIZE)
+                    df = next(chunks, pd.DataFrame())
+                    chunks.close()
+            if flatten_options is not None and input_format in FLATTEN_FORMATS:
+                df = flatten.flatten(df, **flatten_options)
+    finally:
+        if hasattr(source, "seek"):
+            source.seek(0)
+
+    if input_format in ["JSON", "NDJSON"] and not where:
+        df = select_columns(df, columns)
+    return df.head(rows)
+
+
+def read_json_chunks(source, chunksize=DEFAULT_CHUNKSIZE, encoding=None, block_size=JSON_BLOCK_SIZE):
+    """Yield a JSON array of records as DataFrames of at most `chunksize` rows.
+
+    The text is decoded block by block and split into its top-level
+    objects, and each batch of objects is parsed by pd.read_json, so column
+    types come out as for a whole-file read while only one batch is held in
+    memory. A document that is not an array is read whole into one chunk,
+    and an empty array gives one empty chunk.
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder(encoding or "utf-8")()
+    buffer = ""
+    position = None
+    records = []
+    chunks = 0
+    # What may come next inside the array: a record or "]", a "," or "]", or a record
+    expected = "record or ]"
+    finished = False
+    while not finished:
+        block = source.read(block_size)
+        buffer += text_decoder.decode(block, final=not block)
+        if position is None:
+            stripped = buffer.lstrip()
+            if not stripped:
+                if not block:
+                    return
+                continue
+            if stripped[0] != "[":
+                buffer += text_decoder.decode(source.read(), final=True)
+                yield pd.read_json(io.StringIO(buffer))
+                return
+            position = len(buffer) - len(stripped) + 1
+
+        # Split off every complete object that is already buffered
+        while True:
+            while position < len(buffer) and buffer[position] in " \t\r\n":
+                position += 1
+            if position >= len(buffer):
+                break
+            char = buffer[position]
+            if char == "]" and expected != "record":
+                finished = True
+                break
+            if expected == ", or ]":
+                if char != ",":
+                    raise ValueError(f"Expected , or ] between the records of the JSON array, found {char!r}")
+                position += 1
+                expected = "record"
+                continue
+            try:
+                end = decoder.raw_decode(buffer, position)[1]
+            except json.JSONDecodeError as error:
+                # Only a record cut off by the end of the block continues in the next one;
+                # anything else is invalid however much more is read
+                if not block or not json_cut_off(error, buffer):
+                    raise
+                break
+            if end == len(buffer) and block:
+                # A number at the very end may go on in the next block
+                break
+            records.append(buffer[position:end])
+            position = end
+            expected = ", or ]"
+            if len(records) >= chunksize:
+                yield parse_json_records(records)
+                chunks += 1
+                records = []
+        if not block and not finished:
+            raise ValueError("The JSON array ends before its closing ]")
+        buffer = buffer[position:]
+        position = 0
+
+    if records or not chunks:
+        yield parse_json_records(records)
+
+
+def json_cut_off(error, text):
+    """Whether a JSON decoding error can come from `text` ending early rather than from invalid JSON."""
+    return error.msg.startswith("Unterminated string") or len(text) - error.pos <= JSON_CUT_OFF_CHARACTERS
+
+
+def parse_json_records(records):
+    """Parse the source text of JSON objects into one DataFrame."""
+    return pd.read_json(io.StringIO("[" + ",".join(records) + "]"))
+
+
+def frame_chunks(df, chunksize=DEFAULT_CHUNKSIZE):
+    """Yield consecutive row slices of `df`, for the chunk writers."""
+    for start in range(0, len(df), chunksize):
+        yield df.iloc[start:start + chunksize]
+
+
+def xml_records(chunk):
+    """Yield one serialized <row> element per record of `chunk`."""
+    tags = [str(column) for column in chunk.columns]
+    for values in chunk.itertuples(index=False, name=None):
+        fields = []
+        for tag, value in zip(tags, values):
+            if pd.isna(value):
+                fields.append(f"    <{tag}/>\n")
+            else:
+                fields.append(f"    <{tag}>{escape(str(value))}</{tag}>\n")
+        yield "  <row>\n" + "".join(fields) + "  </row>\n"
+
+
+def write_chunks(chunks, output_format, output, compress=None):
+    """Write DataFrame chunks to the binary file `output`, returning the row count.
+
+    `compress` names a codec from compression.COMPRESSIONS to compress with.
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unsupported output format: {output_format}")
+    if compress:
+        with compression.compressed(output, compress) as sink:
+            return write_chunks(chunks, output_format, sink)
+    if output_format == "Excel":
+        return write_excel_chunks(chunks, output)
+    if output_format in ARROW_FORMATS:
+        return write_arrow_chunks(chunks, output_format, output)
+
+    rows = 0
+    first = True
+    columns = None
+    start = output.tell() if output_format in DELIMITERS and rewindable(output) else None
+    if output_format == "JSON":
+        # Same layout as to_json(orient="records"): one array of objects
+        output.write(b"[")
+    elif output_format == "XML":
+        output.write(XML_HEADER)
+
+    for chunk in chunks:
+        if output_format == "JSON":
+            records = chunk.to_json(orient="records")[1:-1]
+            if records:
+                if not first:
+                    output.write(b",")
+                output.write(records.encode("utf-8"))
+                first = False
+        elif output_format == "XML":
+            for record in xml_records(chunk):
+                output.write(record.encode("utf-8"))
+        elif output_format == "NDJSON":
+            output.write(chunk.to_json(orient="records", lines=True).encode("utf-8"))
+        else:
+            # The header is written once, so later chunks must keep its columns
+            # (XML records may not all carry the same fields)
+            if columns is None:
+                columns = chunk.columns
+            elif not chunk.columns.equals(columns):
+                new = chunk.columns.difference(columns, sort=False)
+                if len(new):
+                    # Fields first seen in this chunk: the text so far is written again under a wider header
+                    if start is None:
+                        raise ValueError(
+                            f"Column(s) {', '.join(map(repr, new))} first appear after row {rows:,}, and the "
+                            f"{output_format} output cannot be rewritten (compressed or write-only); write it "
+                            "uncompressed to a file or raise the chunk size"
+                        )
+                    columns = columns.append(new)
+                    rewrite_delimited(output, start, DELIMITERS[output_format], columns)
+                chunk = chunk.reindex(columns=columns)
+            text = chunk.to_csv(sep=DELIMITERS[output_format], index=False, header=first)
+            output.write(text.encode("utf-8"))
+            first = False
+        rows += len(chunk)
+
+    if output_format == "JSON":
+        output.write(b"]")
+    elif output_format == "XML":
+        output.write(XML_FOOTER)
+    return rows
+
+
+def rewrite_delimited(output, start, sep, columns):
+    """Write the delimited text at `start` of `output` again under the header `columns`.
+
+    `columns` adds new columns to the header written so far; they come out
+    empty in the rows already written. The old text is copied to a temporary
+    file and read back chunk by chunk as strings, so values keep their text.
+    """
+    names = [str(column) for column in columns]
+    with tempfile.TemporaryFile() as written:
+        output.seek(start)
+        shutil.copyfileobj(output, written)
+        output.seek(start)
+        output.truncate()
+        written.seek(0)
+        header = True
+        with pd.read_csv(written, sep=sep, dtype=str, keep_default_na=False, chunksize=DEFAULT_CHUNKSIZE) as reader:
+            for chunk in reader:
+                text = chunk.reindex(columns=names).to_csv(sep=sep, index=False, header=header)
+                output.write(text.encode("utf-8"))
+                header = False
+        if header:
+            # Only the header had been written
+            output.write(pd.DataFrame(columns=names).to_csv(sep=sep, index=False).encode("utf-8"))
+
+
+def write_excel_chunks(chunks, output, max_rows=EXCEL_MAX_ROWS):
+    """Append DataFrame chunks to an xlsx workbook, returning the row count.
+
+    xlsxwriter's constant-memory mode flushes every row to disk as soon as
+    the next one starts, so the workbook never sits in memory. Rows past
+    the worksheet limit continue on a new sheet with its own header, as do
+    the rows of a chunk that brings new columns, under the wider header.
+    """
+    try:
+        import xlsxwriter
+    except ImportError:
+        raise ImportError("Excel output needs the xlsxwriter package: pip install xlsxwriter") from None
+
+    workbook = xlsxwriter.Workbook(output, {
+        "constant_memory": True,
+        "default_date_format": "yyyy-mm-dd hh:mm:ss",
+    })
+    header_format = workbook.add_format({"bold": True, "border": 1, "align": "center", "valign": "top"})
+
+    rows = 0
+    columns = None
+    sheet = None
+    sheet_rows = 0
+    try:
+        for chunk in chunks:
+            if columns is None:
+                columns = chunk.columns
+            elif not chunk.columns.equals(columns):
+                new = chunk.columns.difference(columns, sort=False)
+                if len(new):
+                    # Rows already flushed cannot gain cells, so carry on in a new sheet
+                    columns = columns.append(new)
+                    sheet = None
+                chunk = chunk.reindex(columns=columns)
+
+            values = excel_values(chunk)
+            start = 0
+            while start < len(values):
+                if sheet is None or sheet_rows >= max_rows:
+                    sheet = workbook.add_worksheet()
+                    sheet.write_row(0, 0, [str(column) for column in columns], header_format)
+                    sheet_rows = 1
+                stop = start + min(len(values) - start, max_rows - sheet_rows)
+                for row in values[start:stop]:
+                    sheet.write_row(sheet_rows, 0, row)
+                    sheet_rows += 1
+                start = stop
+            rows += len(chunk)
+
+        if sheet is None:
+            # Empty input still produces a valid workbook, with a header if known
+            sheet = workbook.add_worksheet()
+            if columns is not None:
+                sheet.write_row(0, 0, [str(column) for column in columns], header_format)
+    finally:
+        workbook.close()
+    return rows
+
+
+def excel_values(chunk):
+    """Rows of `chunk` as lists of cell values xlsxwriter can write."""
+    chunk = chunk.copy(deep=False)
+    for position in range(chunk.shape[1]):
+        series = chunk.iloc[:, position]
+        if isinstance(series.dtype, pd.DatetimeTZDtype):
+            # Excel has no time zones
+            chunk.isetitem(position, series.dt.tz_localize(None))
+        elif pd.api.types.is_timedelta64_dtype(series):
+            chunk.isetitem(position, series.astype(str))
+    # Missing values become empty cells
+    return chunk.astype(object).where(chunk.notna(), None).values.tolist()
+
+
+def write_arrow_chunks(chunks, output_format, output):
+    """Append DataFrame chunks to a Parquet or Feather file, returning the row count.
+
+    The file takes the column types of the first chunk. A later chunk whose
+    values do not fit them (floats after integers, text in a column that was
+    empty so far, a column that was missing) widens the schema: what was
+    written so far is read back and written again with the wider types.
+    """
+    import pyarrow as pa
+
+    rows = 0
+    schema = None
+    writer = None
+    start = output.tell() if rewindable(output) else None
+    try:
+        for chunk in chunks:
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                schema = table.schema
+                writer = arrow_writer(output_format, output, schema)
+            elif not table.schema.equals(schema):
+                try:
+                    table = fit_table(table, schema)
+                except (KeyError, pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+                    wider = widen_schema(schema, table.schema)
+                    if start is None:
+                        changed = [field.name for field in wider if field not in schema]
+                        raise ValueError(
+                            f"Column(s) {', '.join(map(repr, changed))} change type or first appear after row {rows:,}, "
+                            f"and the {output_format} output cannot be rewritten (compressed or write-only); "
+                            "write it uncompressed to a file or raise the chunk size"
+                        ) from None
+                    writer.close()
+                    # Nothing left to close should the rewrite fail
+                    writer = None
+                    writer = rewrite_arrow(output_format, output, start, wider)
+                    schema = wider
+                    table = fit_table(table, schema)
+            writer.write_table(table)
+            rows += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
+
+def rewindable(output):
+    """Whether what was written to `output` can be read back and replaced."""
+    try:
+        return output.seekable() and output.readable()
+    except (AttributeError, ValueError):
+        return False
+
+
+def arrow_writer(output_format, output, schema):
+    """A Parquet or Feather writer of `schema` tables to `output`."""
+    import pyarrow as pa
+    import pyarrow.parquet
+
+    if output_format == "Parquet":
+        return pyarrow.parquet.ParquetWriter(output, schema)
+    options = pa.ipc.IpcWriteOptions(compression="lz4")
+    return pa.ipc.new_file(output, schema, options=options)
+
+
+def fit_table(table, schema):
+    """`table` cast to the columns and types of `schema`; missing columns come out empty.
+
+    Raises KeyError for a column `schema` lacks and a pyarrow error for values that do not fit.
+    """
+    import pyarrow as pa
+
+    extra = [name for name in table.column_names if name not in schema.names]
+    if extra:
+        raise KeyError(extra[0])
+    columns = [
+        table.column(field.name).cast(field.type) if field.name in table.column_names
+        else pa.nulls(len(table), field.type)
+        for field in schema
+    ]
+    return pa.Table.from_arrays(columns, schema=schema)
+
+
+def widen_schema(schema, other):
+    """A schema holding the values of both: types promoted (int to float, null to anything), new columns last.
+
+    Types with no common promotion, such as numbers and text, become text.
+    The pandas metadata is dropped, as it describes the old types.
+    """
+    import pyarrow as pa
+
+    fields = []
+    for field in schema:
+        if field.name in other.names:
+            pair = [pa.schema([field]), pa.schema([other.field(field.name)])]
+            try:
+                field = pa.unify_schemas(pair, promote_options="permissive").field(0)
+            except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+                field = pa.field(field.name, pa.string())
+        fields.append(field)
+    fields += [field for field in other if field.name not in schema.names]
+    return pa.schema(fields)
+
+
+def rewrite_arrow(output_format, output, start, schema):
+    """Write the Parquet or Feather file at `start` of `output` again with the wider `schema`.
+
+    Returns a writer to go on appending with. The old file is copied to a
+    temporary file and read back batch by batch, so memory stays bounded.
+    """
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet
+
+    with tempfile.TemporaryFile() as written:
+        output.seek(start)
+        shutil.copyfileobj(output, written)
+        output.seek(start)
+        output.truncate()
+        written.seek(0)
+        writer = arrow_writer(output_format, output, schema)
+        try:
+            if output_format == "Parquet":
+                batches = pyarrow.parquet.ParquetFile(written).iter_batches()
+            else:
+                reader = pyarrow.ipc.open_file(written)
+                batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+            for batch in batches:
+                writer.write_table(fit_table(pa.Table.from_batches([batch]), schema))
+        except BaseException:
+            writer.close()
+            raise
+    return writer
+
+
+def stream_convert(source, input_format, output_format, chunksize=DEFAULT_CHUNKSIZE, columns=None,
+                   compress=None, delimiter=None, encoding=None, cleaning_options=None, where=None, stats=None,
+                   profile=None, flatten_options=None):
+    """Convert `source` chunk by chunk into a spooled buffer rewound to the start.
+
+    See convert() for `where`, `stats`, `profile` and `flatten_options`.
+    """
+    output = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    convert(
+        source, output, input_format, output_format, chunksize, columns, compress, delimiter, encoding,
+        cleaning_options, where, stats, profile, flatten_options
+    )
+    output.seek(0)
+    return output
+
+
+def convert(src, dst, input_format, output_format, chunksize=DEFAULT_CHUNKSIZE, columns=None,
+            compress=None, delimiter=None, encoding=None, cleaning_options=None, where=None, stats=None,
+            profile=None, flatten_options=None):
+    """Convert `src` to `dst` and return the number of rows written.
+
+    Both may be paths or binary file objects; `input_format` and
+    `output_format` are names from INPUT_FORMATS and OUTPUT_FORMATS.
+    With `input_format` None the format, delimiter and encoding are sniffed
+    from the content. Compressed input is detected automatically,
+    `compress` compresses the output. `cleaning_options` are keyword
+    arguments for cleaning.clean(), applied to every chunk. `where` is a
+    row filter pushed down into the reader, `flatten_options` flatten
+    nested JSON and NDJSON records (see read_chunks()).
+
+    If `stats` is a dict, the rows written and the bytes read from `src`
+    and written to `dst` are stored in it, showing how much of the input
+    projection and filter pushdown skipped. A profiling.Profile passed as
+    `profile` times the parse, clean and serialize stages.
+    """
+    options = (
+        chunksize, columns, compress, delimiter, encoding, cleaning_options, where, stats, profile, flatten_options
+    )
+    if isinstance(src, str):
+        with open(src, "rb") as src_file:
+            return convert(src_file, dst, input_format, output_format, *options)
+    if isinstance(dst, str):
+        # Readable as well, so a Parquet or Feather schema can be widened (see write_arrow_chunks)
+        with open(dst, "w+b") as dst_file:
+            return convert(src, dst_file, input_format, output_format, *options)
+
+    if input_format is None:
+        detected = sniff.sniff(src)
+        if detected["format"] is None:
+            raise ValueError("Could not detect the input format")
+        input_format = detected["format"]
+        delimiter = delimiter or detected["delimiter"]
+        encoding = encoding or detected["encoding"]
+
+    src = CountingReader(src)
+    start = dst.tell()
+    # Closed explicitly, so a failed write does not leave the reader to the garbage collector
+    chunks = read_chunks(src, input_format, chunksize, columns, delimiter, encoding, where, flatten_options)
+    with contextlib.closing(chunks):
+        if profile is not None:
+            chunks = profile.chunks(chunks, "parse")
+        if cleaning_options:
+            chunks = cleaning.clean_chunks(chunks, **cleaning_options)
+            if profile is not None:
+                chunks = profile.chunks(chunks, "clean")
+        with profile.stage("serialize") if profile is not None else contextlib.nullcontext():
+            rows = write_chunks(chunks, output_format, dst, compress)
+
+    bytes_written = dst.tell() - start
+    if profile is not None:
+        profile.add("parse", bytes_in=src.bytes_read)
+        profile.add("serialize", rows=rows, bytes_out=bytes_written)
+    if stats is not None:
+        stats.update(rows=rows, bytes_read=src.bytes_read, bytes_written=bytes_written)
+    return rows
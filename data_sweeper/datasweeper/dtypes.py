@@ -0,0 +1,86 @@
+"""Type inference and memory downcasting for loaded DataFrames.
+
+Text columns that hold numbers or ISO dates are converted to real types,
+integers and floats are shrunk to the smallest dtype that keeps every
+value, and repetitive strings become categoricals.
+"""
+import pandas as pd
+from pandas.api import types
+
+# A text column becomes a category when its distinct values are at most
+# this fraction of its rows
+CATEGORY_RATIO = 0.5
+
+# Values tried as dates before the whole column is parsed
+DATE_SAMPLE_SIZE = 100
+
+
+def footprint(df):
+    """Deep memory usage of a DataFrame in bytes."""
+    return int(df.memory_usage(deep=True).sum())
+
+
+def downcast_numeric(series):
+    """Shrink an integer or float column without changing any of its values."""
+    if types.is_bool_dtype(series):
+        return series
+    if types.is_integer_dtype(series):
+        if series.empty:
+            return series
+        return pd.to_numeric(series, downcast="unsigned" if series.min() >= 0 else "integer")
+    if types.is_float_dtype(series) and series.dtype != "float32":
+        narrow = series.astype("float32")
+        # Only keep float32 when every value survives the round trip
+        if ((narrow.astype(series.dtype) == series) | series.isna()).all():
+            return narrow
+    return series
+
+
+def infer_text(series, category_ratio=CATEGORY_RATIO, parse_dates=True):
+    """Convert a text column to numbers, dates or a category where possible."""
+    non_null = series.dropna()
+    if non_null.empty:
+        return series
+    text = non_null.astype(str)
+
+    # Leading zeros mark codes (zip codes, ids) that must stay text
+    if not text.str.match(r"^[+-]?0\d").any():
+        numbers = pd.to_numeric(non_null, errors="coerce")
+        if numbers.notna().all():
+            return downcast_numeric(pd.to_numeric(series, errors="coerce"))
+
+    if parse_dates and text.iloc[:DATE_SAMPLE_SIZE].str.match(r"^\d{4}-\d{2}-\d{2}").all():
+        dates = pd.to_datetime(series, format="ISO8601", errors="coerce")
+        if dates.notna().sum() == len(non_null):
+            return dates
+
+    try:
+        distinct = non_null.nunique()
+    except TypeError:
+        # Unhashable values such as nested lists from JSON
+        return series
+    if distinct <= category_ratio * len(series):
+        return series.astype("category")
+    return series
+
+
+def optimize_dtypes(df, category_ratio=CATEGORY_RATIO, parse_dates=True):
+    """Return (optimized copy of `df`, report) with tighter column dtypes.
+
+    The report holds the memory footprint before and after in bytes and the
+    old and new dtype of every column that changed.
+    """
+    result = df.copy(deep=False)
+    changes = {}
+    for position, column in enumerate(df.columns):
+        series = df.iloc[:, position]
+        if types.is_object_dtype(series) or types.is_string_dtype(series):
+            optimized = infer_text(series, category_ratio, parse_dates)
+        else:
+            optimized = downcast_numeric(series)
+        if optimized.dtype != series.dtype:
+            result.isetitem(position, optimized)
+            changes[str(column)] = (str(series.dtype), str(optimized.dtype))
+
+    report = {"bytes_before": footprint(df), "bytes_after": footprint(result), "changes": changes}
+    return result, report
@@ -0,0 +1,92 @@
+"""Simple row filters that can be pushed down into the readers.
+
+A filter is one or more comparisons joined by "and":
+
+    price > 10 and city == "Lahore"
+
+Column names containing spaces or operators go in backticks, string values
+in single or double quotes. Unquoted values are numbers when they parse as
+one. Parquet and Feather evaluate the filter inside pyarrow, so row groups
+whose statistics rule it out are never read; other formats filter each
+chunk as it is parsed.
+"""
+import operator
+import re
+
+OPERATORS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<=": operator.le,
+    ">=": operator.ge,
+    "<": operator.lt,
+    ">": operator.gt,
+}
+
+# One comparison, up to the "and" that follows it or the end of the filter
+# A quoted value is matched whole, so it may contain " and " itself
+CONDITION = re.compile(
+    r"""\s*(`[^`]+`|[^\s=!<>]+)\s*(==|!=|<=|>=|<|>)\s*('[^']*'|"[^"]*"|.+?)\s*(?=\s+and\s|$)""",
+    re.IGNORECASE,
+)
+CONJUNCTION = re.compile(r"\s+and\s+", re.IGNORECASE)
+
+
+def parse_value(text):
+    if len(text) >= 2 and text[0] == text[-1] and text[0] in "'\"":
+        return text[1:-1]
+    for convert in (int, float):
+        try:
+            return convert(text)
+        except ValueError:
+            pass
+    return text
+
+
+def parse_filter(text):
+    """Parse a filter expression into a list of (column, operator, value) conditions."""
+    text = text.strip()
+    conditions = []
+    position = 0
+    while True:
+        match = CONDITION.match(text, position)
+        if match is None:
+            part = CONJUNCTION.split(text[position:], maxsplit=1)[0]
+            raise ValueError(f"Invalid filter condition: {part!r}")
+        column, op, value = match.groups()
+        conditions.append((column.strip("`"), op, parse_value(value)))
+        if match.end() == len(text):
+            return conditions
+        position = CONJUNCTION.match(text, match.end()).end()
+
+
+def filter_columns(conditions):
+    """Columns a parsed filter refers to, in order of first use."""
+    return list(dict.fromkeys(column for column, _, _ in conditions))
+
+
+def apply_filter(df, conditions):
+    """Rows of `df` matching every condition, evaluated one column at a time."""
+    import pandas as pd
+    from pandas.api import types
+
+    mask = pd.Series(True, index=df.index)
+    for column, op, value in conditions:
+        if column not in df.columns:
+            raise ValueError(f"Unknown filter column: {column}")
+        series = df[column]
+        if isinstance(value, (int, float)) and not types.is_numeric_dtype(series):
+            # Text formats such as XML give every value as a string
+            series = pd.to_numeric(series, errors="coerce")
+        mask &= OPERATORS[op](series, value).fillna(False).astype(bool)
+    return df[mask]
+
+
+def arrow_expression(conditions):
+    """The filter as a pyarrow compute expression, for dataset fragment scans."""
+    import pyarrow.compute as pc
+
+    expression = None
+    for column, op, value in conditions:
+        condition = OPERATORS[op](pc.field(column), value)
+        expression = condition if expression is None else expression & condition
+    return expression
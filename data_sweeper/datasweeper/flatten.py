@@ -0,0 +1,61 @@
+"""Flattening of nested JSON records into plain columns.
+
+Nested objects become one column per key, named by joining the keys on the
+way down with a separator, as pd.json_normalize does:
+
+    {"user": {"id": 7, "geo": {"country": "PK"}}}  ->  user.id, user.geo.country
+
+Instead of walking every record, each column holding objects is expanded as
+a whole with a single DataFrame constructor per nesting level, so a chunk
+of NDJSON flattens in a handful of passes. Lists are kept as they are.
+"""
+import pandas as pd
+
+from .formats import DEFAULT_SEPARATOR
+
+
+def expand(series, prefix, max_level=None, sep=DEFAULT_SEPARATOR, level=0):
+    """Yield (name, series) pairs for `series`, with its objects expanded into columns."""
+    if (max_level is not None and level >= max_level) or series.dtype != object:
+        yield prefix, series
+        return
+    is_object = [isinstance(value, dict) for value in series]
+    if not any(is_object):
+        yield prefix, series
+        return
+
+    is_object = pd.Series(is_object, index=series.index)
+    others = series.where(~is_object)
+    if others.notna().any():
+        # Scalars next to objects under the same key keep the plain column name
+        yield prefix, others
+    nested = pd.DataFrame(series[is_object].tolist(), index=series.index[is_object])
+    if len(nested) < len(series):
+        nested = nested.reindex(series.index)
+    for key in nested.columns:
+        yield from expand(nested[key], f"{prefix}{sep}{key}", max_level, sep, level + 1)
+
+
+def flatten(df, max_level=None, sep=DEFAULT_SEPARATOR):
+    """Expand the nested objects of `df` into columns, up to `max_level` levels deep (all when None)."""
+    columns = {}
+    for name in df.columns:
+        columns.update(expand(df[name], str(name), max_level, sep))
+    return pd.DataFrame(columns, index=df.index)
+
+
+def flatten_chunks(chunks, max_level=None, sep=DEFAULT_SEPARATOR):
+    """Flatten DataFrame chunks, keeping every column seen so far in each of them.
+
+    Keys missing from a later chunk are filled with missing values, so the
+    chunks can go to writers that fix the columns on the first chunk. Keys
+    that only turn up after the first chunk are appended at the end, where
+    the writers add them as new columns (see converter.write_chunks).
+    """
+    seen = {}
+    for chunk in chunks:
+        chunk = flatten(chunk, max_level, sep)
+        seen.update(dict.fromkeys(chunk.columns))
+        if len(seen) > len(chunk.columns):
+            chunk = chunk.reindex(columns=list(seen))
+        yield chunk
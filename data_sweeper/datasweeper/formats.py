@@ -0,0 +1,100 @@
+"""Format tables shared by the converter, the Streamlit app and the CLI.
+
+Kept free of pandas so that the command-line tool starts quickly.
+"""
+import os
+
+from .compression import strip_extension
+
+# Input format choice that sniffs the upload instead
+AUTO_DETECT = "Auto-detect"
+
+# Every format DataSweeper can read and write
+INPUT_FORMATS = ["CSV", "Excel", "JSON", "XML", "TXT", "Parquet", "Feather", "NDJSON"]
+OUTPUT_FORMATS = ["CSV", "Excel", "JSON", "XML", "TXT", "Parquet", "Feather", "NDJSON"]
+
+# Number of rows parsed and converted at a time
+DEFAULT_CHUNKSIZE = 50_000
+
+# Field separator for the delimited text formats
+DELIMITERS = {"CSV": ",", "TXT": "\t"}
+
+# Choices of the optional cleaning stage (see cleaning.py)
+CASES = ["lower", "upper", "title"]
+NULL_ACTIONS = ["drop", "fill"]
+# Outliers are clipped to the [q, 1 - q] quantiles of each numeric column
+DEFAULT_CLIP_QUANTILE = 0.01
+
+# Inputs whose nested objects can be flattened into columns (see flatten.py)
+FLATTEN_FORMATS = ["JSON", "NDJSON"]
+DEFAULT_SEPARATOR = "."
+
+# Formats that can be read and written chunk by chunk
+STREAM_INPUT_FORMATS = ["CSV", "TXT", "JSON", "XML", "Parquet", "Feather", "NDJSON"]
+STREAM_OUTPUT_FORMATS = ["CSV", "Excel", "JSON", "TXT", "XML", "Parquet", "Feather", "NDJSON"]
+
+# Columnar formats read and written through pyarrow
+ARROW_FORMATS = ["Parquet", "Feather"]
+
+# Readers that need a seekable file, so compressed input is unpacked first
+RANDOM_ACCESS_FORMATS = ["Excel", "Parquet", "Feather"]
+
+# Conversion engines; "auto" switches to DuckDB for inputs above the threshold
+ENGINES = ["auto", "pandas", "duckdb"]
+DUCKDB_THRESHOLD = 1024 * 1024 * 1024
+
+# Formats DuckDB reads and writes natively, the others go through pyarrow/pandas
+DUCKDB_INPUT_FORMATS = ["CSV", "TXT", "JSON", "NDJSON", "Parquet", "Feather"]
+DUCKDB_OUTPUT_FORMATS = ["CSV", "TXT", "JSON", "NDJSON", "Parquet"]
+
+# Output compression preselected for a format
+DEFAULT_COMPRESSION = {"NDJSON": "gzip"}
+
+# Accepted upload extensions for every input format
+INPUT_EXTENSIONS = {
+    "CSV": ["csv"],
+    "Excel": ["xlsx", "xls"],
+    "JSON": ["json"],
+    "XML": ["xml"],
+    "TXT": ["txt"],
+    "Parquet": ["parquet"],
+    "Feather": ["feather", "arrow"],
+    "NDJSON": ["ndjson", "jsonl"],
+}
+
+# Download MIME type and file extension for every output format
+OUTPUT_TYPES = {
+    "CSV": ("text/csv", "csv"),
+    "Excel": ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "xlsx"),
+    "JSON": ("application/json", "json"),
+    "XML": ("application/xml", "xml"),
+    "TXT": ("text/plain", "txt"),
+    "Parquet": ("application/vnd.apache.parquet", "parquet"),
+    "Feather": ("application/vnd.apache.arrow.file", "feather"),
+    "NDJSON": ("application/x-ndjson", "ndjson"),
+}
+
+
+def supports_streaming(input_format, output_format):
+    """Return True when both formats have a chunked reader/writer."""
+    return input_format in STREAM_INPUT_FORMATS and output_format in STREAM_OUTPUT_FORMATS
+
+
+def input_format_for(path):
+    """Guess the input format from a file name, ignoring any compression extension."""
+    name, _ = strip_extension(os.path.basename(path).lower())
+    for format, extensions in INPUT_EXTENSIONS.items():
+        if any(name.endswith("." + ext) for ext in extensions):
+            return format
+    return None
+
+
+def output_format_for(path):
+    """Guess the output format from a file name, ignoring any compression extension."""
+    name, _ = strip_extension(os.path.basename(path).lower())
+    for format, (_, ext) in OUTPUT_TYPES.items():
+        if name.endswith("." + ext):
+            return format
+    if name.endswith(".jsonl"):
+        return "NDJSON"
+    return None
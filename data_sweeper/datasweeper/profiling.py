@@ -0,0 +1,156 @@
+"""Per-stage timing and memory instrumentation for conversions.
+
+A Profile records, for every stage of a conversion (parse, clean,
+serialize, download, ...), its wall time, rows, bytes in and out and the
+peak resident memory reached while it ran. Streaming conversions interleave
+their stages chunk by chunk, so time is charged to the innermost active
+stage only: a writer pulling a chunk from the reader does not count the
+parsing as serialization.
+
+Peak memory comes from the kernel's resident high-water mark, which is
+reset on Linux whenever a stage starts or stops. It is process-wide, so
+concurrent conversions in the same process show up in each other's peaks.
+Elsewhere the process peak so far is reported instead.
+
+Profile.log() writes the records to the "datasweeper.performance" logger;
+configure_logging() sends them to stderr, or to the file named by the
+DATASWEEPER_PERFORMANCE_LOG environment variable, one JSON object per line.
+"""
+import contextlib
+import json
+import logging
+import os
+import resource
+import sys
+import time
+
+logger = logging.getLogger("datasweeper.performance")
+
+# Environment variable naming a file for the performance log instead of stderr
+LOG_PATH_VARIABLE = "DATASWEEPER_PERFORMANCE_LOG"
+
+
+def configure_logging(path=None):
+    """Emit the performance records as JSON lines to `path`, $DATASWEEPER_PERFORMANCE_LOG or stderr.
+
+    Does nothing once the logger has a handler, so the Streamlit app can
+    call it on every rerun.
+    """
+    if logger.handlers:
+        return
+    path = path or os.environ.get(LOG_PATH_VARIABLE)
+    handler = logging.FileHandler(path) if path else logging.StreamHandler(sys.stderr)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    # The records are complete JSON lines; the root logger's format would wrap them
+    logger.propagate = False
+
+
+def peak_rss():
+    """Resident high-water mark of this process in bytes."""
+    try:
+        # Unlike ru_maxrss, VmHWM starts afresh in a spawned process instead of
+        # inheriting the peak of the parent that forked it
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def reset_peak_rss():
+    """Restart the high-water mark from the current RSS where the kernel allows it."""
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+    except OSError:
+        pass
+
+
+class Profile:
+    """Stage measurements of one conversion."""
+
+    def __init__(self, **context):
+        # Extra fields logged with every record, e.g. the formats converted
+        self.context = context
+        self.stages = {}
+        self._active = []
+        self._started = None
+        self._start = time.perf_counter()
+
+    def _record(self, name):
+        if name not in self.stages:
+            self.stages[name] = {"stage": name, "seconds": 0.0, "rows": None, "bytes_in": None,
+                                 "bytes_out": None, "peak_rss_bytes": 0}
+        return self.stages[name]
+
+    def _switch(self):
+        """Charge the time and peak memory since the last switch to the active stage."""
+        now = time.perf_counter()
+        if self._active:
+            record = self.stages[self._active[-1]]
+            record["seconds"] += now - self._started
+            record["peak_rss_bytes"] = max(record["peak_rss_bytes"], peak_rss())
+        reset_peak_rss()
+        self._started = now
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """Time the body as stage `name`; yields the stage's record for rows and bytes."""
+        record = self._record(name)
+        self._switch()
+        self._active.append(name)
+        try:
+            yield record
+        finally:
+            self._switch()
+            self._active.pop()
+
+    def chunks(self, chunks, name):
+        """Pass DataFrame chunks through, timing their production as stage `name`."""
+        # Registered now rather than on the first chunk, so stages are listed in pipeline order
+        record = self._record(name)
+        return self._timed_chunks(iter(chunks), name, record)
+
+    def _timed_chunks(self, iterator, name, record):
+        while True:
+            with self.stage(name):
+                chunk = next(iterator, None)
+            if chunk is None:
+                return
+            record["rows"] = (record["rows"] or 0) + len(chunk)
+            yield chunk
+
+    def add(self, name, **values):
+        """Add to the counters (rows, bytes_in, bytes_out) of stage `name`."""
+        record = self._record(name)
+        for key, value in values.items():
+            if value is not None:
+                record[key] = (record[key] or 0) + value
+
+    def report(self):
+        """Stage records in the order they first ran, with rows per second filled in."""
+        rows = []
+        for record in self.stages.values():
+            record = dict(record)
+            seconds = record["seconds"]
+            record["rows_per_second"] = record["rows"] / seconds if record["rows"] and seconds else None
+            rows.append(record)
+        return rows
+
+    def total_seconds(self):
+        return time.perf_counter() - self._start
+
+    def log(self):
+        """Emit every stage and a summary as one JSON log record each."""
+        records = self.report()
+        for record in records:
+            logger.info(json.dumps({"event": "stage", **self.context, **record}))
+        peak = max((record["peak_rss_bytes"] for record in records), default=0)
+        summary = {"event": "conversion", **self.context, "seconds": self.total_seconds(), "peak_rss_bytes": peak}
+        logger.info(json.dumps(summary))
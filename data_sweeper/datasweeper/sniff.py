@@ -0,0 +1,124 @@
+"""Detect the format of an upload from its first few kilobytes.
+
+Binary formats are recognised from their signatures, text formats from the
+first characters of the decoded sample, and delimited text with
+csv.Sniffer. Compression and text encoding are reported as well, so the
+matching streaming reader can be chosen before anything is parsed.
+"""
+import codecs
+import csv
+import json
+import os
+
+from . import compression
+
+# Bytes of (decompressed) content inspected
+SNIFF_SIZE = 64 * 1024
+
+# Lines of delimited text handed to csv.Sniffer
+SNIFF_LINES = 20
+
+BINARY_SIGNATURES = [
+    (b"PAR1", "Parquet"),
+    (b"ARROW1", "Feather"),
+    # xlsx workbooks are zip archives, xls workbooks OLE2 compound files
+    (b"PK\x03\x04", "Excel"),
+    (b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1", "Excel"),
+]
+
+BOMS = [
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+]
+
+DELIMITER_CANDIDATES = ",\t;|"
+
+
+def sniff(source, sample_size=SNIFF_SIZE):
+    """Identify a path or seekable binary file from its first bytes.
+
+    Returns a dict with the "format" (None when unrecognised), the
+    "compression" codec, the text "encoding" and the "delimiter" of
+    delimited text; keys that do not apply are None. File objects are
+    left at their original position.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as file:
+            return sniff(file, sample_size)
+
+    position = source.tell()
+    try:
+        codec = compression.detect(source)
+        with compression.decompressed(source) as stream:
+            head = stream.read(sample_size)
+    finally:
+        source.seek(position)
+
+    result = {"format": None, "compression": codec, "encoding": None, "delimiter": None}
+    result.update(sniff_bytes(head, complete=len(head) < sample_size))
+    return result
+
+
+def sniff_bytes(head, complete=False):
+    """Detect the format of a sample; `complete` means it holds the whole file."""
+    for signature, format in BINARY_SIGNATURES:
+        if head.startswith(signature):
+            return {"format": format}
+
+    encoding, text = decode_sample(head, complete)
+    text = text.lstrip()
+    if not text:
+        return {"encoding": encoding}
+    if text.startswith("<"):
+        return {"format": "XML", "encoding": encoding}
+    if text.startswith("["):
+        return {"format": "JSON", "encoding": encoding}
+    if text.startswith("{"):
+        format = "NDJSON" if is_ndjson(text) else "JSON"
+        return {"format": format, "encoding": encoding}
+
+    delimiter = sniff_delimiter(text, complete)
+    return {"format": "TXT" if delimiter == "\t" else "CSV", "encoding": encoding, "delimiter": delimiter}
+
+
+def decode_sample(head, complete=False):
+    """Return (encoding, text) for a byte sample that may end mid-character."""
+    for bom, encoding in BOMS:
+        if head.startswith(bom):
+            return encoding, head.decode(encoding, errors="replace")
+    for encoding in ["utf-8", "cp1252"]:
+        try:
+            return encoding, codecs.getincrementaldecoder(encoding)().decode(head, final=complete)
+        except UnicodeDecodeError:
+            pass
+    # latin-1 maps every byte, so it always decodes
+    return "latin-1", head.decode("latin-1")
+
+
+def is_ndjson(text):
+    """True when the first two lines are each a complete JSON object.
+
+    A single object on a line that ends with a newline is a one-record
+    NDJSON file as well.
+    """
+    lines = [line for line in text.splitlines() if line.strip()][:2]
+    if len(lines) < 2 and not (lines and text.rstrip(" \t").endswith("\n")):
+        return False
+    try:
+        return all(isinstance(json.loads(line), dict) for line in lines)
+    except json.JSONDecodeError:
+        return False
+
+
+def sniff_delimiter(text, complete=False):
+    """Guess the field separator of delimited text, defaulting to a comma."""
+    lines = text.splitlines()
+    if not complete and len(lines) > 1:
+        # The last line of a truncated sample is probably cut short
+        lines = lines[:-1]
+    sample = "\n".join(lines[:SNIFF_LINES])
+    try:
+        return csv.Sniffer().sniff(sample, delimiters=DELIMITER_CANDIDATES).delimiter
+    except csv.Error:
+        return ","
@@ -0,0 +1,238 @@
+"""Out-of-core conversion through DuckDB.
+
+Files larger than memory are scanned by DuckDB straight from disk. Column
+selection, row filters and SQL queries (including aggregations) run inside
+the engine, which spills intermediate results to a temporary directory once
+its memory limit is reached. Formats DuckDB writes natively are produced with
+COPY; the others are fetched as Arrow record batches and handed to the
+streaming writers in converter.py, one batch at a time.
+
+DuckDB is optional (pip install duckdb). Extensions are never downloaded, so
+the engine works offline with the CSV, JSON and Parquet support built into
+the Python package.
+"""
+import contextlib
+import os
+import shutil
+import tempfile
+
+from . import compression, filters
+from .formats import (
+    DEFAULT_CHUNKSIZE, DELIMITERS, DUCKDB_INPUT_FORMATS, DUCKDB_OUTPUT_FORMATS, DUCKDB_THRESHOLD, ENGINES,
+)
+
+# Memory DuckDB may use before it spills to a directory of its own under TEMP_DIRECTORY
+# DuckDB's spill file names are not unique, so connections sharing a directory crash each other
+DEFAULT_MEMORY_LIMIT = "1GB"
+TEMP_DIRECTORY = os.path.join(tempfile.gettempdir(), "datasweeper-duckdb")
+
+# Name of the (filtered, projected) input inside SQL queries
+INPUT_VIEW = "input"
+
+# Text encodings DuckDB's CSV reader decodes itself
+ENCODINGS = {None: None, "utf-8": "utf-8", "utf-8-sig": "utf-8", "utf-16": "utf-16", "latin-1": "latin-1"}
+
+# Compression DuckDB unpacks while scanning text formats
+SCAN_COMPRESSIONS = ["gzip", "zstd"]
+
+
+def _duckdb():
+    try:
+        import duckdb
+    except ImportError:
+        raise ImportError("The DuckDB engine needs the duckdb package: pip install duckdb") from None
+    return duckdb
+
+
+def available():
+    """True when DuckDB is installed."""
+    try:
+        _duckdb()
+    except ImportError:
+        return False
+    return True
+
+
+def supports(input_format, encoding=None):
+    """True when DuckDB can scan `input_format` in `encoding`."""
+    return input_format in DUCKDB_INPUT_FORMATS and encoding in ENCODINGS
+
+
+def should_use(size, input_format, encoding=None, threshold=DUCKDB_THRESHOLD):
+    """Whether "auto" picks DuckDB for an input of `size` bytes."""
+    return size > threshold and supports(input_format, encoding) and available()
+
+
+@contextlib.contextmanager
+def connect(memory_limit=DEFAULT_MEMORY_LIMIT, temp_directory=TEMP_DIRECTORY):
+    """Yield an in-memory DuckDB connection that never downloads extensions.
+
+    It spills to a new directory inside `temp_directory`, removed along with
+    the connection.
+    """
+    os.makedirs(temp_directory, exist_ok=True)
+    with tempfile.TemporaryDirectory(prefix="spill-", dir=temp_directory) as spill_directory:
+        connection = _duckdb().connect(config={
+            "memory_limit": memory_limit,
+            "temp_directory": spill_directory,
+            "autoinstall_known_extensions": False,
+            "autoload_known_extensions": False,
+        })
+        with contextlib.closing(connection):
+            yield connection
+
+
+def quote_identifier(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def quote_literal(value):
+    if isinstance(value, str):
+        return "'" + value.replace("'", "''") + "'"
+    return repr(value)
+
+
+def where_clause(conditions):
+    """A parsed filter (see filters.py) as an SQL boolean expression."""
+    return " AND ".join(
+        f"{quote_identifier(column)} {'=' if op == '==' else op} {quote_literal(value)}"
+        for column, op, value in conditions
+    )
+
+
+def scan(connection, path, input_format, delimiter=None, encoding=None, codec=None):
+    """A lazy DuckDB relation over the input file at `path`."""
+    if input_format in ["CSV", "TXT"]:
+        return connection.read_csv(
+            path, sep=delimiter or DELIMITERS[input_format], header=True, encoding=ENCODINGS[encoding],
+            compression=codec or "none"
+        )
+    if input_format in ["JSON", "NDJSON"]:
+        layout = "newline_delimited" if input_format == "NDJSON" else "array"
+        return connection.read_json(path, format=layout, compression=codec or "uncompressed")
+    if input_format == "Parquet":
+        return connection.read_parquet(path)
+    if input_format == "Feather":
+        import pyarrow.dataset
+
+        # Scanned lazily batch by batch, never loaded as a whole table
+        return connection.from_arrow(pyarrow.dataset.dataset(path, format="ipc"))
+    raise ValueError(f"The DuckDB engine cannot read {input_format}")
+
+
+def copy_options(output_format):
+    """Options of DuckDB's COPY ... TO statement for a natively written format."""
+    if output_format in ["CSV", "TXT"]:
+        return f"FORMAT csv, HEADER true, DELIMITER {quote_literal(DELIMITERS[output_format])}"
+    if output_format == "JSON":
+        return "FORMAT json, ARRAY true"
+    if output_format == "NDJSON":
+        return "FORMAT json"
+    return "FORMAT parquet"
+
+
+@contextlib.contextmanager
+def scannable(src, input_format):
+    """Yield (path, codec) for `src` that DuckDB can scan.
+
+    Compression DuckDB cannot read itself, and binary files without a path,
+    are first unpacked or copied into a temporary file.
+    """
+    if isinstance(src, (str, os.PathLike)):
+        with open(src, "rb") as file:
+            codec = compression.detect(file)
+        if codec is None or (codec in SCAN_COMPRESSIONS and input_format in ["CSV", "TXT", "JSON", "NDJSON"]):
+            yield os.fspath(src), codec
+            return
+
+    with tempfile.NamedTemporaryFile(prefix="datasweeper-") as spill:
+        with compression.decompressed(src) as stream:
+            shutil.copyfileobj(stream, spill)
+        spill.flush()
+        yield spill.name, None
+
+
+def convert(src, dst, input_format, output_format, chunksize=DEFAULT_CHUNKSIZE, columns=None, compress=None,
+            delimiter=None, encoding=None, cleaning_options=None, where=None, stats=None, query=None,
+            memory_limit=DEFAULT_MEMORY_LIMIT, profile=None):
+    """Convert `src` to `dst` with DuckDB and return the number of rows written.
+
+    Takes the same arguments as converter.convert(). `query` is an SQL
+    statement over the view "input", which holds the selected columns and
+    rows matching `where`, e.g. "SELECT city, avg(price) FROM input GROUP BY
+    city". In `stats` the bytes read are the size of the input file. DuckDB
+    parses, queries and writes in one pass, so a `profile` gets a single
+    "duckdb" stage.
+    """
+    if input_format not in DUCKDB_INPUT_FORMATS:
+        raise ValueError(f"The DuckDB engine cannot read {input_format}")
+    if not supports(input_format, encoding):
+        raise ValueError(f"The DuckDB engine cannot decode {encoding} text")
+    if isinstance(dst, (str, os.PathLike)) and (compress or cleaning_options
+                                                  or output_format not in DUCKDB_OUTPUT_FORMATS):
+        with open(dst, "wb") as dst_file:
+            return convert(src, dst_file, input_format, output_format, chunksize, columns, compress, delimiter,
+                           encoding, cleaning_options, where, stats, query, memory_limit, profile)
+
+    if profile is not None:
+        with profile.stage("duckdb") as record:
+            stats = {} if stats is None else stats
+            convert(src, dst, input_format, output_format, chunksize, columns, compress, delimiter, encoding,
+                    cleaning_options, where, stats, query, memory_limit)
+            record.update(rows=stats["rows"], bytes_in=stats["bytes_read"], bytes_out=stats["bytes_written"])
+        return stats["rows"]
+
+    with scannable(src, input_format) as (path, codec), connect(memory_limit) as connection:
+        relation = scan(connection, path, input_format, delimiter, encoding, codec)
+        if where:
+            relation = relation.filter(where_clause(filters.parse_filter(where)))
+        if columns:
+            relation = relation.project(", ".join(quote_identifier(column) for column in columns))
+        if query:
+            relation.create_view(INPUT_VIEW)
+            relation = connection.sql(query)
+        bytes_read = os.path.getsize(path)
+        if isinstance(dst, (str, os.PathLike)):
+            # Written by DuckDB straight to the destination
+            rows = copy(connection, relation, output_format, dst)
+            bytes_written = os.path.getsize(dst)
+        else:
+            start = dst.tell()
+            rows = write(connection, relation, output_format, dst, chunksize, compress, cleaning_options)
+            bytes_written = dst.tell() - start
+
+    if stats is not None:
+        stats.update(rows=rows, bytes_read=bytes_read, bytes_written=bytes_written)
+    return rows
+
+
+def copy(connection, relation, output_format, path):
+    """Write the result of `relation` to `path` with COPY, returning the row count."""
+    relation.create_view("result")
+    statement = f"COPY result TO {quote_literal(os.fspath(path))} ({copy_options(output_format)})"
+    return connection.execute(statement).fetchone()[0]
+
+
+def write(connection, relation, output_format, output, chunksize=DEFAULT_CHUNKSIZE, compress=None,
+          cleaning_options=None):
+    """Write the result of `relation` to the binary file `output`, returning the row count."""
+    if output_format in DUCKDB_OUTPUT_FORMATS and not cleaning_options:
+        # COPY needs a path, so the output goes through a temporary file
+        with tempfile.TemporaryDirectory(prefix="datasweeper-") as workdir:
+            path = os.path.join(workdir, "output")
+            rows = copy(connection, relation, output_format, path)
+            with open(path, "rb") as result:
+                if compress:
+                    with compression.compressed(output, compress) as sink:
+                        shutil.copyfileobj(result, sink)
+                else:
+                    shutil.copyfileobj(result, output)
+        return rows
+
+    # Formats DuckDB cannot write, and the cleaning stage, work on Arrow batches
+    from . import cleaning, converter
+
+    chunks = (batch.to_pandas() for batch in relation.to_arrow_reader(chunksize))
+    if cleaning_options:
+        chunks = cleaning.clean_chunks(chunks, **cleaning_options)
+    return converter.write_chunks(chunks, output_format, output, compress)
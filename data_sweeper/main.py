@@ -5,91 +5,451 @@ import io
 import json
 import xml.etree.ElementTree as ET
 import csv
+import shutil
+import tempfile
 from PIL import Image
 
+from datasweeper import batch, cache, cleaning, compression, converter, dtypes, filters, profiling, sniff, sqlengine
+
+
+def parse_upload(uploaded_file, input_format, columns=None, optimize=False, delimiter=None, encoding=None,
+                 where=None, flatten_options=None):
+    """Read the whole upload into a DataFrame based on its format.
+
+    With `optimize`, column types are inferred and downcast, and the memory
+    report is kept in df.attrs["dtype_report"]. `delimiter` and `encoding`
+    come from sniffing the upload. Only rows matching the `where` filter are
+    kept; the bytes read from the upload are stored in df.attrs["bytes_read"].
+    `flatten_options` expand nested JSON and NDJSON objects into columns.
+    """
+    conditions = filters.parse_filter(where) if where else []
+    # The filter may need columns that are not selected for the output
+    read_columns = converter.read_columns(columns, conditions)
+    upload = converter.CountingReader(uploaded_file)
+
+    # Compressed uploads are unpacked on the fly (or into a temp file for random-access readers)
+    seekable = input_format in converter.RANDOM_ACCESS_FORMATS
+    with compression.decompressed(upload, seekable=seekable) as source:
+        if input_format == "CSV":
+            df = pd.read_csv(source, sep=delimiter or ",", usecols=read_columns, encoding=encoding)
+        elif input_format == "Excel":
+            df = pd.read_excel(source, usecols=read_columns)
+        elif input_format in ["JSON", "NDJSON"]:
+            # A batch of records at a time: parsing the whole text at once holds every
+            # decoded object as well, about ten times the size of the file
+            chunks = list(converter.read_chunks(
+                source, input_format, encoding=encoding, flatten_options=flatten_options
+            ))
+            df = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
+        elif input_format == "XML":
+            # Parse record by record instead of building the whole element tree
+            chunks = list(converter.read_xml_chunks(source, columns=read_columns))
+            df = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
+        elif input_format == "TXT":
+            df = pd.read_csv(source, sep=delimiter or "\t", usecols=read_columns, encoding=encoding)
+        elif input_format == "Parquet":
+            # pyarrow evaluates the filter while scanning and skips row groups that cannot match
+            row_filter = filters.arrow_expression(conditions) if conditions else None
+            df = pd.read_parquet(source, columns=read_columns, filters=row_filter)
+        elif input_format == "Feather":
+            df = pd.read_feather(source, columns=read_columns)
+
+    if conditions and input_format != "Parquet":
+        df = filters.apply_filter(df, conditions)
+    # JSON and NDJSON have no reader-level projection, and filter columns go after filtering
+    df = converter.select_columns(df, columns)
+    df.attrs["bytes_read"] = upload.bytes_read
+
+    if optimize:
+        df, report = dtypes.optimize_dtypes(df)
+        df.attrs["dtype_report"] = report
+    return df
+
+
+
+def spill_upload(uploaded_file):
+    """Path of a temporary copy of the upload, written once per uploaded file.
+
+    DuckDB scans files on disk, so without it every conversion would copy
+    the upload again. The copy of an earlier upload in the session is removed.
+    """
+    spills = st.session_state.setdefault("upload_spills", {})
+    if uploaded_file.file_id not in spills:
+        for spill in spills.values():
+            spill.close()
+        spills.clear()
+        spill = tempfile.NamedTemporaryFile(prefix="datasweeper-upload-")
+        uploaded_file.seek(0)
+        shutil.copyfileobj(uploaded_file, spill)
+        spill.flush()
+        uploaded_file.seek(0)
+        spills[uploaded_file.file_id] = spill
+    return spills[uploaded_file.file_id].name
+
+
+def show_profile(profile):
+    """Show the stage measurements of a conversion and log them."""
+    with st.expander("Performance"):
+        report = pd.DataFrame(profile.report())
+        report["peak_rss_mb"] = report.pop("peak_rss_bytes") / 1024 ** 2
+        st.dataframe(report)
+        st.caption(f"Total {profile.total_seconds():.2f}s")
+    profile.log()
+
+@st.cache_resource
+def get_parse_cache():
+    """One parse cache shared by every session and rerun."""
+    return cache.ParseCache()
+
+
+def upload_hash(uploaded_file):
+    """Content hash of the upload, computed once per uploaded file."""
+    hashes = st.session_state.setdefault("upload_hashes", {})
+    if uploaded_file.file_id not in hashes:
+        hashes[uploaded_file.file_id] = cache.content_hash(uploaded_file)
+    return hashes[uploaded_file.file_id]
+
+
 st.set_page_config(page_title="DataSweeper - File Converter", layout="wide")
 
+# Conversion measurements go to stderr as JSON lines, or to $DATASWEEPER_PERFORMANCE_LOG
+profiling.configure_logging()
+
 st.title("DataSweeper - Universal File Converter")
 st.write("Convert between multiple file formats easily!")
 
 # Supported formats
-input_formats = ["CSV", "Excel", "JSON", "XML", "TXT"]
-output_formats = ["CSV", "Excel", "JSON", "XML", "TXT"]
+input_formats = [converter.AUTO_DETECT] + converter.INPUT_FORMATS
+output_formats = converter.OUTPUT_FORMATS
 
 # Sidebar
 st.sidebar.title("Settings")
 input_format = st.sidebar.selectbox("Select Input Format", input_formats)
 output_format = st.sidebar.selectbox("Select Output Format", output_formats)
 
+# Streaming mode converts large files in fixed-size chunks
+streaming_mode = st.sidebar.checkbox("Streaming mode (large files)", value=False)
+# Batch mode converts many files (or zip archives) in parallel worker processes
+batch_mode = st.sidebar.checkbox("Batch mode (many files or a zip)", value=False)
+chunksize = st.sidebar.number_input(
+    "Rows per chunk", min_value=1000, value=converter.DEFAULT_CHUNKSIZE, step=10000,
+    disabled=not (streaming_mode or batch_mode)
+)
+
+# Column projection: only the listed columns are read from the input
+columns_text = st.sidebar.text_input("Columns to read (comma-separated, blank for all)")
+columns = [column.strip() for column in columns_text.split(",") if column.strip()] or None
+
+# Row filter, evaluated by the reader so rows that do not match are never converted
+where = st.sidebar.text_input("Row filter", placeholder="price > 10 and city == 'Lahore'").strip() or None
+if where:
+    try:
+        filters.parse_filter(where)
+    except ValueError as e:
+        st.sidebar.error(str(e))
+        where = None
+
+# Number of rows parsed for the preview
+preview_rows = st.sidebar.number_input("Preview rows", min_value=1, max_value=1000, value=converter.PREVIEW_ROWS)
+
+# Output compression, NDJSON is gzipped unless another choice is made
+compression_options = ["None"] + compression.COMPRESSIONS
+default_compression = converter.DEFAULT_COMPRESSION.get(output_format, "None")
+compress = st.sidebar.selectbox(
+    "Compress output", compression_options, index=compression_options.index(default_compression)
+)
+compress = None if compress == "None" else compress
+
+# Infer numbers/dates in text columns and shrink dtypes after loading
+optimize_types = st.sidebar.checkbox("Optimize column types on load", value=False)
+
+# DuckDB converts on disk and spills instead of running out of memory; "auto" picks it for large uploads
+engine = st.sidebar.selectbox("Conversion engine", sqlengine.ENGINES)
+engine_threshold = st.sidebar.number_input(
+    "Use DuckDB above (MB)", min_value=1, value=sqlengine.DUCKDB_THRESHOLD // 1024 ** 2, disabled=engine != "auto"
+)
+sql_query = st.sidebar.text_area(
+    "SQL query (DuckDB)", placeholder="SELECT city, count(*) FROM input GROUP BY city",
+    disabled=engine == "pandas"
+).strip() or None
+
+# Nested JSON objects become one column per key, e.g. user.geo.country
+with st.sidebar.expander("Nested JSON"):
+    flatten_json = st.checkbox("Flatten nested objects")
+    flatten_depth = st.number_input("Levels to flatten (0 for all)", min_value=0, value=0, disabled=not flatten_json)
+    flatten_separator = st.text_input("Key separator", value=converter.DEFAULT_SEPARATOR, disabled=not flatten_json)
+flatten_options = None
+if flatten_json:
+    flatten_options = {"max_level": flatten_depth or None, "sep": flatten_separator or converter.DEFAULT_SEPARATOR}
+
+# Optional cleaning between reading and writing, applied chunk by chunk when streaming
+with st.sidebar.expander("Cleaning"):
+    trim_text = st.checkbox("Trim whitespace")
+    text_case = st.selectbox("Text case", ["Unchanged"] + cleaning.CASES)
+    dedup = st.checkbox("Remove duplicate rows")
+    dedup_text = st.text_input("Duplicate key columns (blank for whole rows)", disabled=not dedup)
+    null_action = st.selectbox("Missing values", ["Keep", "Drop rows", "Fill"])
+    fill_value = st.text_input("Fill value", disabled=null_action != "Fill")
+    clip_outliers = st.checkbox("Clip outliers")
+    clip_quantile = st.number_input(
+        "Clip quantile", min_value=0.001, max_value=0.49, value=cleaning.DEFAULT_CLIP_QUANTILE,
+        step=0.01, format="%.3f", disabled=not clip_outliers
+    )
+    clip_text = st.text_input("Columns to clip (blank for all numeric)", disabled=not clip_outliers)
+
+cleaning_options = None
+if trim_text or text_case != "Unchanged" or dedup or null_action != "Keep" or clip_outliers:
+    cleaning_options = {
+        "trim": trim_text,
+        "case": None if text_case == "Unchanged" else text_case,
+        "dedup": ([key.strip() for key in dedup_text.split(",") if key.strip()] or True) if dedup else None,
+        "nulls": {"Keep": None, "Drop rows": "drop", "Fill": "fill"}[null_action],
+        "fill_value": fill_value,
+        "clip": clip_quantile if clip_outliers else None,
+        "clip_columns": [column.strip() for column in clip_text.split(",") if column.strip()] or None,
+    }
+
 # File uploader
-uploaded_file = st.file_uploader(f"Upload your {input_format} file", type=[format.lower() for format in input_formats])
+upload_types = [ext for format in converter.INPUT_FORMATS for ext in converter.INPUT_EXTENSIONS[format]]
+# Compressed files are recognised from their content, so any of these may wrap any format
+upload_types += list(compression.EXTENSIONS.values())
+auto_detect = input_format == converter.AUTO_DETECT
+format_label = "" if auto_detect else f"{input_format} "
+if batch_mode:
+    uploaded_files = st.file_uploader(
+        f"Upload your {format_label}files or zip archives", type=upload_types + ["zip"], accept_multiple_files=True
+    )
+    uploaded_file = None
+else:
+    uploaded_file = st.file_uploader(f"Upload your {format_label}file", type=upload_types)
 
+# Sniff the first few KB so the right reader is chosen before anything is parsed
+delimiter = encoding = None
 if uploaded_file is not None:
-    try:
-        # Read input file based on format
-        if input_format == "CSV":
-            df = pd.read_csv(uploaded_file)
-        elif input_format == "Excel":
-            df = pd.read_excel(uploaded_file)
-        elif input_format == "JSON":
-            df = pd.read_json(uploaded_file)
-        elif input_format == "XML":
-            xml_data = ET.parse(uploaded_file)
-            root = xml_data.getroot()
-            data = []
-            for child in root:
-                data.append({subchild.tag: subchild.text for subchild in child})
-            df = pd.DataFrame(data)
-        elif input_format == "TXT":
-            df = pd.read_csv(uploaded_file, sep="\t")
+    detected = sniff.sniff(uploaded_file)
+    if auto_detect and detected["format"] is None:
+        st.error("Could not detect the file format, please select the input format in the sidebar.")
+        uploaded_file = None
+    elif auto_detect or detected["format"] == input_format:
+        input_format = detected["format"]
+        delimiter, encoding = detected["delimiter"], detected["encoding"]
+        details = [f"delimiter {delimiter!r}" if delimiter else None, encoding, detected["compression"]]
+        st.caption(f"Detected {input_format} ({', '.join(d for d in details if d)})")
+    elif detected["format"] is not None:
+        st.warning(f"This file looks like {detected['format']} rather than {input_format}.")
+
+if batch_mode and uploaded_files:
+    if st.button("Convert all"):
+        st.subheader("Converted Files")
+        progress_bar = st.progress(0.0, text="Converting...")
 
-        # Display preview
+        def show_progress(done, total, result):
+            status = "failed" if result["error"] else f"{result['rows']:,} rows in {result['seconds']:.2f}s"
+            progress_bar.progress(done / total, text=f"{done}/{total} – {result['file']}: {status}")
+
+        archive, results = batch.convert_batch(
+            [(f.name, f) for f in uploaded_files], None if auto_detect else input_format, output_format,
+            int(chunksize), columns, compress, progress=show_progress, cleaning_options=cleaning_options,
+            where=where, flatten_options=flatten_options
+        )
+        st.dataframe(pd.DataFrame(results))
+        st.download_button(
+            label="Download converted files",
+            data=archive.read(),
+            file_name="converted.zip",
+            mime="application/zip"
+        )
+
+if uploaded_file is not None:
+    try:
+        # Only the first rows are parsed for the preview, the full parse waits for Convert
         st.subheader("Preview of uploaded data")
-        st.dataframe(df.head())
-
-        # Convert and download
-        if st.button("Convert"):
-            st.subheader("Converted File")
-            
-            if output_format == "CSV":
-                output = df.to_csv(index=False)
-                mime = "text/csv"
-                ext = "csv"
-            elif output_format == "Excel":
-                output = io.BytesIO()
-                df.to_excel(output, index=False)
-                mime = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                ext = "xlsx"
-            elif output_format == "JSON":
-                output = df.to_json(orient="records")
-                mime = "application/json"
-                ext = "json"
-            elif output_format == "XML":
-                output = df.to_xml(index=False)
-                mime = "application/xml"
-                ext = "xml"
-            elif output_format == "TXT":
-                output = df.to_csv(sep="\t", index=False)
-                mime = "text/plain"
-                ext = "txt"
-
-            # Create download button
-            if output_format == "Excel":
-                output.seek(0)
-                st.download_button(
-                    label="Download converted file",
-                    data=output.read(),
-                    file_name=f"converted.{ext}",
-                    mime=mime
+        preview_stats = {}
+        preview = converter.preview(
+            uploaded_file, input_format, int(preview_rows), columns, delimiter, encoding, where, flatten_options,
+            preview_stats
+        )
+        st.dataframe(preview)
+        if len(preview) < preview_rows and not preview_stats.get("complete", True):
+            # The filter is only tried on the start of the file here; Convert applies it to every row
+            st.caption(
+                f"{len(preview):,} matching rows in the first {preview_stats['rows_scanned']:,} rows; "
+                "the conversion filters the whole file."
+            )
+
+        use_duckdb = engine == "duckdb" or (engine == "auto" and (
+            sql_query is not None
+            or sqlengine.should_use(uploaded_file.size, input_format, encoding, engine_threshold * 1024 ** 2)
+        ))
+        if use_duckdb and not (sqlengine.available() and sqlengine.supports(input_format, encoding)):
+            st.info("The DuckDB engine is not available for this file, using pandas instead.")
+            use_duckdb = False
+        elif use_duckdb and flatten_options and input_format in converter.FLATTEN_FORMATS:
+            st.info("The DuckDB engine does not flatten nested JSON, using pandas instead.")
+            use_duckdb = False
+        if sql_query and not use_duckdb:
+            st.warning("SQL queries need the DuckDB engine and are ignored.")
+
+        if use_duckdb or (streaming_mode and converter.supports_streaming(input_format, output_format)):
+            if st.button("Convert"):
+                st.subheader("Converted File")
+                stats = {}
+                profile = profiling.Profile(
+                    input_format=input_format, output_format=output_format,
+                    engine="duckdb" if use_duckdb else "streaming"
+                )
+                if use_duckdb:
+                    # DuckDB scans a temp copy of the upload and spills to disk above its memory limit
+                    output = tempfile.SpooledTemporaryFile(max_size=converter.SPOOL_MAX_SIZE)
+                    sqlengine.convert(
+                        spill_upload(uploaded_file), output, input_format, output_format, int(chunksize), columns, compress,
+                        delimiter, encoding, cleaning_options, where, stats, query=sql_query, profile=profile
+                    )
+                    output.seek(0)
+                else:
+                    # Read, convert and write one chunk at a time into a spooled buffer
+                    output = converter.stream_convert(
+                        uploaded_file, input_format, output_format, int(chunksize), columns, compress,
+                        delimiter, encoding, cleaning_options, where, stats, profile, flatten_options
+                    )
+                st.caption(
+                    f"{stats['rows']:,} rows: read {stats['bytes_read'] / 1024 ** 2:.1f} MB of "
+                    f"{uploaded_file.size / 1024 ** 2:.1f} MB, emitted {stats['bytes_written'] / 1024 ** 2:.1f} MB"
                 )
-            else:
-                st.download_button(
-                    label="Download converted file",
-                    data=output,
-                    file_name=f"converted.{ext}",
-                    mime=mime
+                mime, ext = converter.OUTPUT_TYPES[output_format]
+                if compress:
+                    mime = compression.MIME_TYPES[compress]
+                    ext += "." + compression.EXTENSIONS[compress]
+                with profile.stage("download") as record:
+                    data = output.read()
+                    st.download_button(
+                        label="Download converted file",
+                        data=data,
+                        file_name=f"converted.{ext}",
+                        mime=mime
+                    )
+                    record["bytes_out"] = len(data)
+                show_profile(profile)
+        else:
+            if streaming_mode:
+                st.info("Streaming is not available for this format pair, using the standard converter.")
+
+            # Convert and download
+            if st.button("Convert"):
+                # Parsed uploads are cached, so converting again to another format skips the parse
+                cache_key = (
+                    upload_hash(uploaded_file), input_format, tuple(columns or ()), optimize_types,
+                    delimiter, encoding, where, tuple(sorted(flatten_options.items())) if flatten_options else None
+                )
+                profile = profiling.Profile(input_format=input_format, output_format=output_format, engine="pandas")
+                parse_cache = get_parse_cache()
+                hits = parse_cache.hits
+                with profile.stage("parse") as record:
+                    df = parse_cache.get_or_parse(
+                        cache_key,
+                        lambda: parse_upload(
+                            uploaded_file, input_format, columns, optimize_types, delimiter, encoding, where,
+                            flatten_options
+                        )
+                    )
+                    record["rows"] = len(df)
+                    # A cache hit reads nothing from the upload
+                    record["bytes_in"] = 0 if parse_cache.hits > hits else df.attrs.get("bytes_read", 0)
+
+                report = df.attrs.get("dtype_report")
+                if report:
+                    st.caption(
+                        f"Memory: {report['bytes_before'] / 1024 ** 2:.1f} MB → "
+                        f"{report['bytes_after'] / 1024 ** 2:.1f} MB after type optimization"
+                    )
+                    if report["changes"]:
+                        with st.expander("Column type changes"):
+                            st.dataframe(pd.DataFrame(
+                                [(column, old, new) for column, (old, new) in report["changes"].items()],
+                                columns=["Column", "Before", "After"]
+                            ))
+
+                if cleaning_options:
+                    # The cached parse stays untouched, cleaning works on a copy
+                    rows_before = len(df)
+                    with profile.stage("clean") as record:
+                        df = cleaning.clean(df, **cleaning_options)
+                        record["rows"] = len(df)
+                    st.caption(f"Cleaning: {len(df):,} of {rows_before:,} rows kept")
+
+                st.subheader("Converted File")
+
+                with profile.stage("serialize") as record:
+                    if output_format == "CSV":
+                        output = df.to_csv(index=False)
+                        mime = "text/csv"
+                        ext = "csv"
+                    elif output_format == "Excel":
+                        # Constant-memory writer, continues on a new sheet past Excel's row limit
+                        # Handed a chunk at a time, so cell values are only ever converted for one chunk
+                        output = io.BytesIO()
+                        converter.write_chunks(converter.frame_chunks(df), "Excel", output)
+                        mime = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                        ext = "xlsx"
+                    elif output_format == "JSON":
+                        # Serialized a chunk at a time instead of as one string the size of the output
+                        output = io.BytesIO()
+                        converter.write_chunks(converter.frame_chunks(df), "JSON", output)
+                        mime = "application/json"
+                        ext = "json"
+                    elif output_format == "XML":
+                        output = df.to_xml(index=False)
+                        mime = "application/xml"
+                        ext = "xml"
+                    elif output_format == "TXT":
+                        output = df.to_csv(sep="\t", index=False)
+                        mime = "text/plain"
+                        ext = "txt"
+                    elif output_format == "Parquet":
+                        output = io.BytesIO()
+                        df.to_parquet(output, index=False)
+                        mime, ext = converter.OUTPUT_TYPES[output_format]
+                    elif output_format == "Feather":
+                        output = io.BytesIO()
+                        df.reset_index(drop=True).to_feather(output)
+                        mime, ext = converter.OUTPUT_TYPES[output_format]
+                    elif output_format == "NDJSON":
+                        output = io.BytesIO()
+                        converter.write_chunks(converter.frame_chunks(df), "NDJSON", output)
+                        mime, ext = converter.OUTPUT_TYPES[output_format]
+
+                    if isinstance(output, str):
+                        # Encoded here rather than by the download button, so the emitted size is known
+                        output = output.encode("utf-8")
+                    record["rows"] = len(df)
+                    record["bytes_out"] = output.getbuffer().nbytes if isinstance(output, io.BytesIO) else len(output)
+                if compress:
+                    with profile.stage("compress") as record:
+                        record["bytes_in"] = profile.stages["serialize"]["bytes_out"]
+                        output = compression.compress_bytes(
+                            output.getvalue() if isinstance(output, io.BytesIO) else output, compress
+                        )
+                        record["bytes_out"] = len(output)
+                    mime = compression.MIME_TYPES[compress]
+                    ext += "." + compression.EXTENSIONS[compress]
+
+                bytes_written = output.getbuffer().nbytes if isinstance(output, io.BytesIO) else len(output)
+                st.caption(
+                    f"{len(df):,} rows: read {df.attrs.get('bytes_read', 0) / 1024 ** 2:.1f} MB of "
+                    f"{uploaded_file.size / 1024 ** 2:.1f} MB, emitted {bytes_written / 1024 ** 2:.1f} MB"
                 )
 
+                # Create download button; Streamlit keeps its own copy of the bytes to serve
+                with profile.stage("download") as record:
+                    st.download_button(
+                        label="Download converted file",
+                        data=output,
+                        file_name=f"converted.{ext}",
+                        mime=mime
+                    )
+                    record["bytes_out"] = bytes_written
+                show_profile(profile)
+
     except Exception as e:
         st.error(f"An error occurred: {str(e)}")
         st.write("Please make sure you've selected the correct input format and the file is valid.")
@@ -100,6 +460,13 @@ st.sidebar.subheader("Supported Operations")
 st.sidebar.write("• CSV ↔ Excel")
 st.sidebar.write("• JSON ↔ XML")
 st.sidebar.write("• TXT ↔ CSV")
+st.sidebar.write("• Parquet ↔ Feather ↔ NDJSON")
+
+parse_cache = get_parse_cache()
+st.sidebar.caption(
+    f"Parse cache: {len(parse_cache)} uploads, {parse_cache.total_bytes / 1024 ** 2:.1f} MB, "
+    f"{parse_cache.hits} hits / {parse_cache.misses} misses"
+)
 
 # Footer
 st.markdown("---")
@@ -0,0 +1,109 @@
+# Benchmarks for the Personal Library Manager
+# Builds a synthetic catalog and compares searching it with the trigram index
+# against the linear scan over a list of dicts that earlier versions used,
+# and the memory each book takes as a dict, a sqlite3.Row and a Book.
+#
+# Run with:  python benchmarks.py --books 500000
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+import store
+
+WORDS = [
+    "shadow", "river", "garden", "empire", "winter", "silent", "crimson", "journey", "ocean", "forgotten",
+    "kingdom", "secret", "house", "stars", "iron", "glass", "city", "night", "storm", "letters",
+]
+FIRST_NAMES = ["Zakia", "Omar", "Ayesha", "Hamza", "Sara", "Bilal", "Fatima", "Usman", "Hina", "Ali"]
+LAST_NAMES = ["Bashir", "Khan", "Malik", "Qureshi", "Siddiqui", "Chaudhry", "Hussain", "Raza", "Iqbal", "Shah"]
+GENRES = ["Fiction", "Mystery", "History", "Poetry", "Science", "Fantasy", "Biography", "Romance"]
+
+# Search terms: common and rare words, a title number, an author, and a term too short for the index
+QUERIES = [("title", "river"), ("title", "crimson glass"), ("title", "12345"), ("author", "hina iqbal"),
+           ("author", "sh")]
+
+
+# A reproducible catalog of `count` books as dicts, the way library.txt held them
+def make_books(count, seed=0):
+    rng = random.Random(seed)
+    books = []
+    for i in range(count):
+        books.append({
+            "title": " ".join(rng.choice(WORDS).title() for _ in range(rng.randint(2, 4))) + f" {i}",
+            "author": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+            "year": rng.randint(1850, 2024),
+            "genre": rng.choice(GENRES),
+            "read": rng.random() < 0.4,
+        })
+    return books
+
+
+# The search from earlier versions: lower-case every title on every query
+def linear_search(books, field, term):
+    term = term.lower()
+    return [book for book in books if term in book[field].lower()]
+
+
+# Median milliseconds of `repeat` calls
+def time_ms(func, *args, repeat=5):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+# Bytes per book of every book in the library, fetched with `row_factory`
+# Counts everything the records keep alive, the strings included
+def bytes_per_book(library, row_factory):
+    cursor = library.cursor()
+    cursor.row_factory = row_factory
+    tracemalloc.start()
+    books = cursor.execute(f"SELECT {store.BOOK_COLUMNS} FROM books ORDER BY id").fetchall()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size / len(books)
+
+
+def as_dict(cursor, row):
+    return dict(zip(store.FIELDS, row))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Personal Library Manager")
+    parser.add_argument("--books", type=int, default=500_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    books = make_books(args.books)
+    with tempfile.TemporaryDirectory() as workdir:
+        library = store.open_library(os.path.join(workdir, "library.db"), legacy_path="")
+        start = time.perf_counter()
+        with library:
+            library.executemany(store.INSERT_BOOK, [store.book_row(book) for book in books])
+        print(f"{args.books:,} books stored and indexed in {time.perf_counter() - start:.1f}s")
+
+        print(f"{'record':<12} {'bytes per book':>15}")
+        for name, row_factory in [("dict", as_dict), ("sqlite3.Row", sqlite3.Row), ("Book", store.book_factory)]:
+            print(f"{name:<12} {bytes_per_book(library, row_factory):>15,.0f}")
+
+        print(f"{'search':<22} {'matches':>8} {'linear scan':>12} {'trigram index':>14} {'speed-up':>9}")
+        for field, term in QUERIES:
+            matches = len(store.search_books(library, field, term))
+            if matches != len(linear_search(books, field, term)):
+                raise SystemExit(f"{field} {term!r}: the index and the scan disagree")
+            linear = time_ms(linear_search, books, field, term, repeat=args.repeat)
+            indexed = time_ms(store.search_books, library, field, term, repeat=args.repeat)
+            print(f"{field + ' ' + repr(term):<22} {matches:>8,} {linear:>9.1f} ms {indexed:>11.1f} ms "
+                  f"{linear / indexed:>8.1f}x")
+        library.close()
+
+
+if __name__ == "__main__":
+    main()
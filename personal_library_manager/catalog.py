@@ -0,0 +1,241 @@
+# Import and export of whole catalogs for the Personal Library Manager
+# Catalogs are CSV, JSON (an array of books) or NDJSON (one book per line)
+# files with the title, author, year, genre and read fields.
+# Files are read and written a batch of books at a time, so a catalog of
+# any size needs no more memory than one batch, and every batch is checked
+# and saved by a few SQL statements in its own transaction.
+import csv
+import itertools
+import json
+import os
+import sys
+import time
+
+import store
+
+# Books read, checked and committed together
+BATCH_SIZE = 10_000
+
+# Characters read from a JSON file at a time
+JSON_BLOCK_SIZE = 1 << 20
+
+# A decoding error this close to the end of the text may just be a book cut off
+# by the end of the block, e.g. in the middle of "true" or a \uXXXX escape
+CUT_OFF_CHARACTERS = 6
+
+# File extensions of each catalog format
+FORMATS = {".csv": "csv", ".json": "json", ".ndjson": "ndjson", ".jsonl": "ndjson"}
+
+# Batches are loaded into this table, then checked and copied into books all at once
+# year has INTEGER affinity: "1999" and 1999.0 are stored as the integer 1999,
+# while "19x9" or 1999.5 keep their type and fail the check below
+STAGING_TABLE = """CREATE TEMP TABLE IF NOT EXISTS import_batch (
+    record INTEGER, title TEXT, author TEXT, year INTEGER, genre TEXT, read
+)"""
+
+# A book needs a title, an author and a whole-number year
+VALID = "coalesce(typeof(year) = 'integer' AND trim(title) <> '' AND trim(author) <> '', 0)"
+
+# Copies the valid books of a batch into the library; books already saved are skipped
+INSERT_VALID = f"""INSERT OR IGNORE INTO books (title, author, year, genre, read, title_key, author_key)
+    SELECT title, author, year, coalesce(genre, ''),
+           lower(trim(coalesce(read, ''))) IN ('1', 'true', 'yes', 'y', 'read'),
+           normalize_key(title), normalize_key(author)
+    FROM import_batch WHERE {VALID} ORDER BY record"""
+
+# Record numbers of the books in a batch that failed the check
+SELECT_INVALID = f"SELECT record FROM import_batch WHERE NOT {VALID} ORDER BY record"
+
+# Rejected records listed by number at the end of an import
+MAX_REPORTED = 10
+
+
+# Catalog format from the file extension, unless one was given
+def catalog_format(path, format=None):
+    if format:
+        return format
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in FORMATS:
+        raise ValueError(f"can't tell the format of {path}; use --format csv, json or ndjson")
+    return FORMATS[extension]
+
+
+# Print how far an import or export has got, overwriting the previous line
+def report_progress(verb, rows, start, end="\r"):
+    seconds = time.perf_counter() - start
+    rate = rows / seconds if seconds else 0
+    print(f"{verb} {rows:,} books ({rate:,.0f} rows/s)", end=end, file=sys.stderr, flush=True)
+
+
+# Books from a CSV file as (record, title, author, year, genre, read) rows
+# The header names the columns; genre and read may be left out
+def read_csv(f):
+    reader = csv.reader(f)
+    header = [name.strip().lower() for name in next(reader, [])]
+    missing = [field for field in ["title", "author", "year"] if field not in header]
+    if missing:
+        raise ValueError(f"the CSV header has no {', '.join(missing)} column")
+    # Columns the file lacks read the None appended to every row
+    columns = [header.index(field) if field in header else -1 for field in store.FIELDS]
+    for record, row in enumerate(reader, 1):
+        if not row:
+            continue
+        if len(row) < len(header):
+            row.extend([None] * (len(header) - len(row)))
+        row.append(None)
+        yield (record, *[row[column] for column in columns])
+
+
+# A JSON value as it can be stored: nested lists and objects are dropped, so the book fails the check
+# true and false are kept only as a read status; anywhere else they would pass for the numbers 1 and 0
+def scalar(value, field=None):
+    if isinstance(value, bool):
+        return value if field == "read" else None
+    return value if isinstance(value, (str, int, float)) else None
+
+
+# (record, title, author, year, genre, read) from a decoded JSON book
+def json_row(record, book):
+    if not isinstance(book, dict):
+        return (record, None, None, None, None, None)
+    return (record, *[scalar(book.get(field), field) for field in store.FIELDS])
+
+
+# Whether a JSON decoding error can come from the text ending early rather than from invalid JSON:
+# an unterminated string, or an error in the last few characters
+def cut_off(error, text):
+    return error.msg.startswith("Unterminated string") or len(text) - error.pos <= CUT_OFF_CHARACTERS
+
+
+# Books from a JSON array, decoded one at a time from blocks of the file
+# instead of loading the whole array with json.load
+def read_json(f, block_size=JSON_BLOCK_SIZE):
+    decoder = json.JSONDecoder()
+    buffer, position, at_end = "", 0, False
+    # What may come next: the opening "[", a book or "]", a "," or "]", or a book
+    expected = "["
+    record = 0
+    while True:
+        while position < len(buffer) and buffer[position] in " \t\r\n":
+            position += 1
+        if position == len(buffer):
+            if at_end:
+                raise ValueError("the JSON catalog ends before its closing ]")
+            buffer, position = f.read(block_size), 0
+            at_end = not buffer
+            continue
+
+        char = buffer[position]
+        if expected == "[":
+            if char != "[":
+                raise ValueError("a JSON catalog must be an array of books")
+            position += 1
+            expected = "book or ]"
+        elif char == "]" and expected != "book":
+            return
+        elif expected == ", or ]":
+            if char != ",":
+                raise ValueError(f"expected , or ] between books in the JSON catalog, found {char!r}")
+            position += 1
+            expected = "book"
+        else:
+            try:
+                book, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError as error:
+                # Invalid JSON is reported straight away; there is no telling where the next book starts
+                if at_end or not cut_off(error, buffer):
+                    raise ValueError(f"book {record + 1} of the JSON catalog is not valid JSON: {error.msg}") from None
+                book, end = None, None
+            # A book cut off by the end of the block (or a number that may go on) needs the next block
+            if end is None or (end == len(buffer) and not at_end):
+                more = f.read(block_size)
+                buffer, position, at_end = buffer[position:] + more, 0, not more
+                continue
+            record += 1
+            yield json_row(record, book)
+            position = end
+            expected = ", or ]"
+
+
+# Books from an NDJSON file; a line that is not valid JSON is rejected like any invalid book
+def read_ndjson(f):
+    for record, line in enumerate(f, 1):
+        if not line.strip():
+            continue
+        try:
+            book = json.loads(line)
+        except json.JSONDecodeError:
+            book = None
+        yield json_row(record, book)
+
+
+READERS = {"csv": read_csv, "json": read_json, "ndjson": read_ndjson}
+
+
+# Add every valid book in a catalog file to the library, a batch per transaction
+# A book that is already in the library is skipped, so an interrupted import can
+# simply be run again. Returns the number of books added, skipped and rejected
+def import_catalog(connection, path, format=None, batch_size=BATCH_SIZE):
+    reader = READERS[catalog_format(path, format)]
+    added = skipped = read = 0
+    rejected = []
+    start = time.perf_counter()
+    connection.execute(STAGING_TABLE)
+    # utf-8-sig skips the byte order mark Excel and other programs put at the start of their exports
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        for batch in itertools.batched(reader(f), batch_size):
+            with connection:
+                connection.execute("DELETE FROM import_batch")
+                connection.executemany("INSERT INTO import_batch VALUES (?, ?, ?, ?, ?, ?)", batch)
+                cursor = connection.execute(INSERT_VALID)
+                invalid = [row[0] for row in connection.execute(SELECT_INVALID)]
+            read += len(batch)
+            added += cursor.rowcount
+            skipped += len(batch) - len(invalid) - cursor.rowcount
+            rejected.extend(invalid)
+            report_progress("Read", read, start)
+    connection.execute("DROP TABLE import_batch")
+    report_progress("Read", read, start, end="\n")
+
+    print(f"Added {added:,} books, skipped {skipped:,} already in the library, rejected {len(rejected):,}")
+    if rejected:
+        listed = ", ".join(str(record) for record in rejected[:MAX_REPORTED])
+        more = " and more" if len(rejected) > MAX_REPORTED else ""
+        print(f"Rejected records (no title, author or whole-number year): {listed}{more}")
+    return added, skipped, len(rejected)
+
+
+# Write every book in the library to a catalog file, a batch at a time
+# Read status is written as yes/no in CSV and true/false in JSON; returns the number of books
+def export_catalog(connection, path, format=None, batch_size=BATCH_SIZE):
+    format = catalog_format(path, format)
+    cursor = connection.execute("SELECT title, author, year, genre, read FROM books ORDER BY id")
+    # Plain tuples are enough here and quicker to build than rows
+    cursor.row_factory = None
+    written = 0
+    start = time.perf_counter()
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        if format == "csv":
+            writer = csv.writer(f)
+            writer.writerow(store.FIELDS)
+        elif format == "json":
+            f.write("[")
+        while batch := cursor.fetchmany(batch_size):
+            if format == "csv":
+                writer.writerows((*book[:4], "yes" if book[4] else "no") for book in batch)
+            else:
+                lines = [
+                    json.dumps(dict(zip(store.FIELDS, (*book[:4], bool(book[4])))), ensure_ascii=False)
+                    for book in batch
+                ]
+                if format == "json":
+                    # Every book after the first follows a comma
+                    f.write(("\n" if not written else ",\n") + ",\n".join(lines))
+                else:
+                    f.write("\n".join(lines) + "\n")
+            written += len(batch)
+            report_progress("Wrote", written, start)
+        if format == "json":
+            f.write("\n]\n")
+    report_progress("Wrote", written, start, end="\n")
+    return written
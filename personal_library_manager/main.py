@@ -1,18 +1,71 @@
+import argparse
+import sys
+
+import catalog
+import store
+
+
+# Command line options: with no command the interactive menu opens,
+# "import FILE" and "export FILE" move whole catalogs in and out of the library
+def parse_args():
+    parser = argparse.ArgumentParser(description="Personal Library Manager")
+    commands = parser.add_subparsers(dest="command")
+    for name, help in [("import", "add the books in a catalog file to the library"),
+                       ("export", "write every book in the library to a catalog file")]:
+        command = commands.add_parser(name, help=help)
+        command.add_argument("file", help="CSV, JSON or NDJSON catalog")
+        command.add_argument("--format", choices=["csv", "json", "ndjson"],
+                             help="catalog format (default: from the file extension)")
+        command.add_argument("--batch-size", type=int, default=catalog.BATCH_SIZE,
+                             help="books per batch and transaction")
+    return parser.parse_args()
+
+
+# Show the library a page at a time in `sort` order (title, author or year)
+# Pages are fetched as they are shown, and each is printed with a single write
+def show_pages(library, sort, page_size):
+    total_books, read_books = store.count_books(library)
+    pages = -(-total_books // page_size)
+    # Where each page seen so far starts, so Previous can go back to it
+    starts = [None]
+    while True:
+        page = len(starts)
+        books, next_start = store.page_books(library, sort, starts[-1], page_size)
+        lines = [f"\nYour Library (page {page} of {pages}, by {sort}):"]
+        first = (page - 1) * page_size + 1
+        lines += [f"{i}. {book}" for i, book in enumerate(books, first)]
+        sys.stdout.write("\n".join(lines) + "\n")
+
+        # Enter or n goes forward, p back, q returns to the menu
+        command = input("Next page (Enter/n), previous page (p) or back to menu (q): ").strip().lower()
+        if command in ("", "n") and page < pages:
+            starts.append(next_start)
+        elif command == "p" and page > 1:
+            starts.pop()
+        elif command == "q" or (command in ("", "n") and page == pages):
+            return
+
+
 def main():
-    # Initialize empty library list to store books
-    # This will hold all our book records as dictionaries
-    library = []
-    try:
-        # Try to load existing library from file
-        # Opens library.txt in read mode to load previously saved books
-        with open('library.txt', 'r') as f:
-            import json
-            # Convert JSON string from file back into Python list
-            library = json.load(f)
-    except FileNotFoundError:
-        # If file doesn't exist, continue with empty library
-        # This happens when program runs for first time
-        pass
+    args = parse_args()
+
+    # Open the library database (created, and filled from library.txt, on first run)
+    # Books stay on disk and are only read when they are shown,
+    # so opening a library of any size is instant
+    library = store.open_library()
+
+    if args.command:
+        # Import or export a catalog instead of opening the menu
+        try:
+            if args.command == "import":
+                catalog.import_catalog(library, args.file, args.format, args.batch_size)
+            else:
+                catalog.export_catalog(library, args.file, args.format, args.batch_size)
+        except (OSError, ValueError) as error:
+            raise SystemExit(f"Error: {error}")
+        finally:
+            library.close()
+        return
 
     while True:
         # Main program loop that keeps running until user chooses to exit
@@ -24,6 +77,7 @@ def main():
         print("4. Display all books")
         print("5. Display statistics")
         print("6. Exit")
+        print("7. Mark a book as read or unread")
 
         # Get user's menu choice
         choice = input("Enter your choice: ")
@@ -33,6 +87,11 @@ def main():
             # Collect all necessary details about the book from user
             title = input("Enter the book title: ")
             author = input("Enter the author: ")
+            # Each book is saved only once: same title and author, ignoring case and spacing
+            # The key index answers this straight away, however big the library is
+            if store.has_book(library, title, author):
+                print("This book is already in your library")
+                continue
             
             # Loop to ensure valid year input
             # Keeps asking until user enters a valid integer
@@ -56,19 +115,20 @@ def main():
                 "genre": genre,
                 "read": read
             }
-            # Add the new book dictionary to library list
-            library.append(book)
-            print("Book added successfully!")
+            # Save the new book to the database right away
+            if store.add_book(library, book):
+                print("Book added successfully!")
+            else:
+                print("This book is already in your library")
 
         elif choice == "2":
             # Option 2: Removing a book from library
-            # Get book title to remove and store initial library size
+            # Get the title of the book to remove
             title = input("Enter the title of the book to remove: ")
-            initial_len = len(library)
-            # Create new list excluding the book with matching title (case insensitive)
-            library = [book for book in library if book["title"].lower() != title.lower()]
-            # Check if a book was actually removed by comparing lengths
-            if len(library) < initial_len:
+            # Delete every book with a matching title (ignoring case and spacing), found through the key index
+            removed = store.remove_books(library, title)
+            # Check if a book was actually removed
+            if removed:
                 print("Book removed successfully!")
             else:
                 print("Book not found")
@@ -84,60 +144,91 @@ def main():
             if search_choice == "1":
                 # Search by title (case insensitive)
                 # Finds partial matches too, not just exact matches
-                search_term = input("Enter the title: ").lower()
-                matches = [book for book in library if search_term in book["title"].lower()]
+                search_term = input("Enter the title: ")
+                matches = store.search_books(library, "title", search_term)
             else:
                 # Search by author (case insensitive)
                 # Also finds partial matches in author names
-                search_term = input("Enter the author: ").lower()
-                matches = [book for book in library if search_term in book["author"].lower()]
+                search_term = input("Enter the author: ")
+                matches = store.search_books(library, "author", search_term)
 
             # Display all matching books with full details
             if matches:
                 print("\nMatching Books:")
                 for i, book in enumerate(matches, 1):
-                    # Convert boolean read status to user-friendly string
-                    read_status = "Read" if book["read"] else "Unread"
-                    print(f"{i}. {book['title']} by {book['author']} ({book['year']}) - {book['genre']} - {read_status}")
+                    # A Book prints as: title by author (year) - genre - Read/Unread
+                    print(f"{i}. {book}")
             else:
                 print("No matching books found")
 
         elif choice == "4":
             # Option 4: Displaying all books
-            # Shows complete library listing if not empty
-            if library:
-                print("\nYour Library:")
-                for i, book in enumerate(library, 1):
-                    # Format each book's information in a readable way
-                    read_status = "Read" if book["read"] else "Unread"
-                    print(f"{i}. {book['title']} by {book['author']} ({book['year']}) - {book['genre']} - {read_status}")
+            # Shows the library a page at a time, sorted by title, author or year
+            # Each page is read from that order's index, so paging is equally quick anywhere in the library
+            total_books, read_books = store.count_books(library)
+            if total_books > 0:
+                print("Sort by:")
+                print("1. Title")
+                print("2. Author")
+                print("3. Year")
+                sort = {"1": "title", "2": "author", "3": "year"}.get(input("Enter your choice: "), "title")
+
+                # Keep asking until the page size is a positive number (Enter keeps the default)
+                while True:
+                    answer = input(f"Books per page (default {store.PAGE_SIZE}): ").strip()
+                    if not answer:
+                        page_size = store.PAGE_SIZE
+                        break
+                    if answer.isdigit() and int(answer) > 0:
+                        page_size = int(answer)
+                        break
+                    print("Please enter a positive number")
+                show_pages(library, sort, page_size)
             else:
                 print("Your library is empty")
 
         elif choice == "5":
             # Option 5: Library Statistics
-            # Calculate and display reading progress
-            total_books = len(library)
+            # Calculate and display reading progress, overall and per genre, decade and author
+            # Every count is kept up to date as books are added, removed and marked read,
+            # so nothing here looks at the books themselves
+            total_books, read_books = store.count_books(library)
             if total_books > 0:
-                # Count books marked as read
-                read_books = len([book for book in library if book["read"]])
                 # Calculate percentage of books read
                 percent_read = (read_books / total_books) * 100
                 print(f"\nTotal books: {total_books}")
                 print(f"Percentage read: {percent_read:.1f}%")
+                print(f"Read: {read_books}, Unread: {total_books - read_books}")
+
+                # One section per grouping; authors are limited to the ten with most books
+                for heading, grouping, limit in [("By genre", "genre", -1), ("By decade", "decade", -1),
+                                                 ("Top authors", "author", 10)]:
+                    print(f"\n{heading}:")
+                    for value, total, read in store.group_counts(library, grouping, limit):
+                        # Decades are stored as their first year, e.g. 1990 for the 1990s
+                        label = f"{value}s" if grouping == "decade" else value or "(none)"
+                        print(f"  {label}: {total} books, {read / total * 100:.1f}% read")
             else:
                 print("\nYour library is empty")
 
         elif choice == "6":
-            # Option 6: Save and Exit
-            # Save current library state to file before exiting
-            with open('library.txt', 'w') as f:
-                import json
-                # Convert library list to JSON string and save to file
-                json.dump(library, f)
-            print("Library saved to file. Goodbye!")
+            # Option 6: Exit
+            # Every change was already saved when it was made, so just close the database
+            library.close()
+            print("Library saved. Goodbye!")
             break
 
+        elif choice == "7":
+            # Option 7: Toggle read status
+            # The book is found by title and author, ignoring case and spacing, through the key index
+            title = input("Enter the book title: ")
+            author = input("Enter the author: ")
+            read = store.toggle_read(library, title, author)
+            if read is None:
+                print("Book not found")
+            else:
+                print("Marked as read" if read else "Marked as unread")
+
         else:
             # Handle invalid menu choices
             print("Invalid choice. Please try again.")
@@ -0,0 +1,376 @@
+# SQLite storage for the Personal Library Manager
+# Every book is a row in library.db, and every add or remove is committed
+# as soon as it is made, so a crash can no longer lose the whole session.
+# Opening the database reads none of the books, so startup takes the same
+# few milliseconds whether the library holds ten books or a million.
+import json
+import os
+import sqlite3
+import sys
+import unicodedata
+
+# Database file, and the JSON file earlier versions saved the library to
+DATABASE = "library.db"
+LEGACY_FILE = "library.txt"
+
+# Adds (sign +) or takes away (sign -) one book (row new or old) in book_counts,
+# as the first version of the counts did: by the genre and author exactly as typed
+COUNT_BOOK_BY_NAME = """INSERT INTO book_counts (grouping, value, total, read) VALUES
+                ('all', '', {sign}1, {sign}{row}.read),
+                ('genre', {row}.genre, {sign}1, {sign}{row}.read),
+                ('author', {row}.author, {sign}1, {sign}{row}.read),
+                ('decade', {row}.year - {row}.year % 10, {sign}1, {sign}{row}.read)
+            ON CONFLICT (grouping, value) DO UPDATE
+            SET total = total + excluded.total, read = read + excluded.read"""
+
+# Adds (sign +) or takes away (sign -) one book (row new or old) in book_counts
+# Genres and authors are counted by their normalized key, so "Ann" and " ann " are one author,
+# shown under the name of the first book counted; a group that was emptied takes the next book's name
+COUNT_BOOK = """INSERT INTO book_counts (grouping, value, total, read, name) VALUES
+                ('all', '', {sign}1, {sign}{row}.read, NULL),
+                ('genre', normalize_key({row}.genre), {sign}1, {sign}{row}.read, trim({row}.genre)),
+                ('author', {row}.author_key, {sign}1, {sign}{row}.read, trim({row}.author)),
+                ('decade', {row}.year - {row}.year % 10, {sign}1, {sign}{row}.read, NULL)
+            ON CONFLICT (grouping, value) DO UPDATE
+            SET total = total + excluded.total, read = read + excluded.read,
+                name = iif(total > 0, name, excluded.name)"""
+
+# Schema changes, each a list of statements applied in order;
+# PRAGMA user_version records how many of them have run
+MIGRATIONS = [
+    [
+        """CREATE TABLE books (
+            id INTEGER PRIMARY KEY,
+            title TEXT NOT NULL,
+            author TEXT NOT NULL,
+            year INTEGER NOT NULL,
+            genre TEXT NOT NULL,
+            read INTEGER NOT NULL DEFAULT 0
+        )""",
+        # Removal looks books up by title, ignoring case
+        "CREATE INDEX books_title ON books (title COLLATE NOCASE)",
+    ],
+    [
+        # Trigram inverted index over title and author: every three-character
+        # piece of the case-folded text points at the books containing it
+        """CREATE VIRTUAL TABLE books_search USING fts5(
+            title, author, content='books', content_rowid='id', tokenize='trigram'
+        )""",
+        "INSERT INTO books_search (books_search) VALUES ('rebuild')",
+        # Kept in step with the books table on every add, remove and edit
+        """CREATE TRIGGER books_search_insert AFTER INSERT ON books BEGIN
+            INSERT INTO books_search (rowid, title, author) VALUES (new.id, new.title, new.author);
+        END""",
+        """CREATE TRIGGER books_search_delete AFTER DELETE ON books BEGIN
+            INSERT INTO books_search (books_search, rowid, title, author)
+            VALUES ('delete', old.id, old.title, old.author);
+        END""",
+        """CREATE TRIGGER books_search_update AFTER UPDATE OF title, author ON books BEGIN
+            INSERT INTO books_search (books_search, rowid, title, author)
+            VALUES ('delete', old.id, old.title, old.author);
+            INSERT INTO books_search (rowid, title, author) VALUES (new.id, new.title, new.author);
+        END""",
+    ],
+    [
+        # Normalized title and author (see normalize_key), the identity of a book
+        "ALTER TABLE books ADD COLUMN title_key TEXT NOT NULL DEFAULT ''",
+        "ALTER TABLE books ADD COLUMN author_key TEXT NOT NULL DEFAULT ''",
+        "UPDATE books SET title_key = normalize_key(title), author_key = normalize_key(author)",
+        # Earlier versions let the same book be added twice; only the first copy is kept
+        "DELETE FROM books WHERE id NOT IN (SELECT min(id) FROM books GROUP BY title_key, author_key)",
+        # Finds a book, or every book with a title, in a few page reads however big the library,
+        # and makes the database itself refuse a second copy of a book
+        "CREATE UNIQUE INDEX books_key ON books (title_key, author_key)",
+        "DROP INDEX books_title",
+    ],
+    [
+        # Running totals of books and read books: one row for the whole library
+        # (grouping 'all') and one per genre, author and decade.
+        # Rows whose books are all removed stay behind with a total of 0
+        """CREATE TABLE book_counts (
+            grouping TEXT NOT NULL,
+            value NOT NULL,
+            total INTEGER NOT NULL,
+            read INTEGER NOT NULL,
+            PRIMARY KEY (grouping, value)
+        ) WITHOUT ROWID""",
+        # Largest genres and authors first without sorting them all
+        "CREATE INDEX book_counts_total ON book_counts (grouping, total)",
+        """INSERT INTO book_counts (grouping, value, total, read)
+            SELECT 'all', '', count(*), coalesce(sum(read), 0) FROM books
+            UNION ALL SELECT 'genre', genre, count(*), sum(read) FROM books GROUP BY genre
+            UNION ALL SELECT 'author', author, count(*), sum(read) FROM books GROUP BY author
+            UNION ALL SELECT 'decade', year - year % 10, count(*), sum(read) FROM books GROUP BY 2""",
+        # Every add, remove and edit changes just the rows of the book's own groups
+        f"""CREATE TRIGGER book_counts_insert AFTER INSERT ON books BEGIN
+            {COUNT_BOOK_BY_NAME.format(row="new", sign="+")};
+        END""",
+        f"""CREATE TRIGGER book_counts_delete AFTER DELETE ON books BEGIN
+            {COUNT_BOOK_BY_NAME.format(row="old", sign="-")};
+        END""",
+        f"""CREATE TRIGGER book_counts_update AFTER UPDATE OF author, year, genre, read ON books BEGIN
+            {COUNT_BOOK_BY_NAME.format(row="old", sign="-")};
+            {COUNT_BOOK_BY_NAME.format(row="new", sign="+")};
+        END""",
+    ],
+    [
+        # The listing's sort orders (see SORT_ORDERS) read straight off an index:
+        # books_key already keeps books by title, these keep them by author and by year
+        "CREATE UNIQUE INDEX books_author_order ON books (author_key, title_key)",
+        "CREATE INDEX books_year ON books (year)",
+    ],
+    [
+        # Genres and authors are counted by normalized key (see COUNT_BOOK), with the name shown for each
+        "ALTER TABLE book_counts ADD COLUMN name TEXT",
+        "DELETE FROM book_counts WHERE grouping IN ('genre', 'author')",
+        # min(id) makes genre and author the names of the first book of each group
+        """INSERT INTO book_counts (grouping, value, total, read, name)
+            SELECT grouping, value, total, read, name FROM (
+                SELECT 'genre' AS grouping, normalize_key(genre) AS value, count(*) AS total,
+                       sum(read) AS read, trim(genre) AS name, min(id)
+                FROM books GROUP BY 2
+                UNION ALL SELECT 'author', author_key, count(*), sum(read), trim(author), min(id)
+                FROM books GROUP BY author_key
+            )""",
+        "DROP TRIGGER book_counts_insert",
+        "DROP TRIGGER book_counts_delete",
+        "DROP TRIGGER book_counts_update",
+        f"""CREATE TRIGGER book_counts_insert AFTER INSERT ON books BEGIN
+            {COUNT_BOOK.format(row="new", sign="+")};
+        END""",
+        f"""CREATE TRIGGER book_counts_delete AFTER DELETE ON books BEGIN
+            {COUNT_BOOK.format(row="old", sign="-")};
+        END""",
+        f"""CREATE TRIGGER book_counts_update AFTER UPDATE OF author, author_key, year, genre, read ON books BEGIN
+            {COUNT_BOOK.format(row="old", sign="-")};
+            {COUNT_BOOK.format(row="new", sign="+")};
+        END""",
+    ],
+    [
+        # The trigram index covers the case-folded keys instead of the titles and authors as typed,
+        # so every search folds case like short searches and normalize_key do ("ss" for "ß")
+        "DROP TRIGGER books_search_insert",
+        "DROP TRIGGER books_search_delete",
+        "DROP TRIGGER books_search_update",
+        "DROP TABLE books_search",
+        """CREATE VIRTUAL TABLE books_search USING fts5(
+            title_key, author_key, content='books', content_rowid='id', tokenize='trigram'
+        )""",
+        "INSERT INTO books_search (books_search) VALUES ('rebuild')",
+        """CREATE TRIGGER books_search_insert AFTER INSERT ON books BEGIN
+            INSERT INTO books_search (rowid, title_key, author_key) VALUES (new.id, new.title_key, new.author_key);
+        END""",
+        """CREATE TRIGGER books_search_delete AFTER DELETE ON books BEGIN
+            INSERT INTO books_search (books_search, rowid, title_key, author_key)
+            VALUES ('delete', old.id, old.title_key, old.author_key);
+        END""",
+        """CREATE TRIGGER books_search_update AFTER UPDATE OF title_key, author_key ON books BEGIN
+            INSERT INTO books_search (books_search, rowid, title_key, author_key)
+            VALUES ('delete', old.id, old.title_key, old.author_key);
+            INSERT INTO books_search (rowid, title_key, author_key) VALUES (new.id, new.title_key, new.author_key);
+        END""",
+    ],
+]
+
+# Columns of a book, in the order they are stored
+FIELDS = ["title", "author", "year", "genre", "read"]
+
+# Adds a book with its keys; a book that is already in the library is skipped
+INSERT_BOOK = (
+    "INSERT OR IGNORE INTO books (title, author, year, genre, read, title_key, author_key) "
+    "VALUES (?, ?, ?, ?, ?, ?, ?)"
+)
+
+# Columns of the books a query returns, in Book order
+BOOK_COLUMNS = "books.title, books.author, books.year, books.genre, books.read"
+
+# Orders the listing can be sorted in, by the columns that put books in that order
+# The columns tell every book apart, so each page can start right after the last
+# book of the page before instead of skipping over all the earlier pages
+SORT_ORDERS = {"title": ["title_key", "author_key"], "author": ["author_key", "title_key"], "year": ["year", "id"]}
+
+# Books per page of the listing
+PAGE_SIZE = 20
+
+# Shortest search term the trigram index can look up; shorter ones are matched by scanning every book
+MIN_INDEXED_TERM = 3
+
+
+# Open (or create) the library database
+# Brings the schema up to date and, the first time, moves the books over
+# from library.txt so nothing saved by earlier versions is lost
+def open_library(path=DATABASE, legacy_path=LEGACY_FILE):
+    connection = sqlite3.connect(path)
+    # Rows can be read like the old dicts: book["title"]
+    connection.row_factory = sqlite3.Row
+    # Lets SQL statements (the schema upgrade) compute keys exactly as Python does
+    connection.create_function("normalize_key", 1, normalize_key, deterministic=True)
+    # Write-ahead logging: each commit appends to the log instead of rewriting
+    # pages in place, and readers never wait for the writer.
+    # NORMAL sync is still safe against the program crashing
+    connection.execute("PRAGMA journal_mode = WAL")
+    connection.execute("PRAGMA synchronous = NORMAL")
+
+    version = connection.execute("PRAGMA user_version").fetchone()[0]
+    if version < len(MIGRATIONS):
+        with connection:
+            # One transaction, so a failed upgrade leaves the database as it was
+            connection.execute("BEGIN")
+            for migration in MIGRATIONS[version:]:
+                for statement in migration:
+                    connection.execute(statement)
+            connection.execute(f"PRAGMA user_version = {len(MIGRATIONS)}")
+            if version == 0 and os.path.exists(legacy_path):
+                migrate_legacy(connection, legacy_path)
+    return connection
+
+
+# One book read from the database
+# __slots__ stores the five values in fixed places instead of a dict per book
+# with its own copy of the key table, and since a library repeats the same
+# authors and genres, each of those is interned so every book shares one string
+class Book:
+    __slots__ = tuple(FIELDS)
+
+    def __init__(self, title, author, year, genre, read):
+        self.title = title
+        self.author = sys.intern(author)
+        self.year = year
+        self.genre = sys.intern(genre)
+        self.read = bool(read)
+
+    def __str__(self):
+        read_status = "Read" if self.read else "Unread"
+        return f"{self.title} by {self.author} ({self.year}) - {self.genre} - {read_status}"
+
+
+# Row factory for queries selecting BOOK_COLUMNS
+def book_factory(cursor, row):
+    return Book(*row)
+
+
+# Text with case and accents written as separate characters folded away, in every alphabet
+def fold_case(text):
+    return unicodedata.normalize("NFKC", text).casefold()
+
+
+# Title or author reduced to what tells books apart:
+# case, accents written as separate characters and extra spaces are ignored
+def normalize_key(text):
+    return " ".join(fold_case(text).split())
+
+
+# Values for INSERT_BOOK from a book dict
+def book_row(book):
+    return [book[field] for field in FIELDS] + [normalize_key(book["title"]), normalize_key(book["author"])]
+
+
+# Copy the books saved in the old library.txt (a JSON list of dicts) into the database
+# Runs inside the transaction that creates the database, so it happens exactly once
+# Books listed more than once are moved once; returns the number of books moved
+def migrate_legacy(connection, legacy_path=LEGACY_FILE):
+    with open(legacy_path, "r") as f:
+        books = json.load(f)
+    cursor = connection.executemany(INSERT_BOOK, [book_row(book) for book in books])
+    duplicates = len(books) - cursor.rowcount
+    skipped = f", skipped {duplicates} duplicates" if duplicates else ""
+    print(f"Moved {cursor.rowcount} books from {legacy_path} into the library database{skipped}")
+    return cursor.rowcount
+
+
+# Add one book (a dict with the FIELDS keys) and commit it straight away
+# Returns False, adding nothing, when a book with the same title and author is already saved
+def add_book(connection, book):
+    with connection:
+        cursor = connection.execute(INSERT_BOOK, book_row(book))
+    return cursor.rowcount == 1
+
+
+# Whether a book with this title and author is in the library, looked up in the key index
+def has_book(connection, title, author):
+    cursor = connection.execute(
+        "SELECT 1 FROM books WHERE title_key = ? AND author_key = ?", [normalize_key(title), normalize_key(author)]
+    )
+    return cursor.fetchone() is not None
+
+
+# Remove every book with this title (ignoring case and spacing), returning how many were removed
+def remove_books(connection, title):
+    with connection:
+        cursor = connection.execute("DELETE FROM books WHERE title_key = ?", [normalize_key(title)])
+    return cursor.rowcount
+
+
+# Books whose title or author (field) contains the search term, ignoring case, as Book objects
+# Both the index and the scan match the case-folded term against the case-folded key
+def search_books(connection, field, term):
+    cursor = connection.cursor()
+    cursor.row_factory = book_factory
+    term = fold_case(term)
+    if len(term) >= MIN_INDEXED_TERM:
+        # The index narrows the search down to books containing every trigram
+        # of the term, and only those are checked for the whole term
+        phrase = '"' + term.replace('"', '""') + '"'
+        return cursor.execute(
+            f"SELECT {BOOK_COLUMNS} FROM books_search JOIN books ON books.id = books_search.rowid "
+            "WHERE books_search MATCH ? ORDER BY books.id", [f"{field}_key : {phrase}"]
+        ).fetchall()
+
+    # LIKE on its own only ignores the case of ASCII letters
+    # % and _ in the term are matched literally
+    pattern = "%" + term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+    return cursor.execute(
+        f"SELECT {BOOK_COLUMNS} FROM books WHERE {field}_key LIKE ? ESCAPE '\\' ORDER BY id", [pattern]
+    ).fetchall()
+
+
+# One page of books in a SORT_ORDERS order, starting after the cursor `after` (None for the first page)
+# Returns the books and the cursor of the next page; the sort index is read from the
+# cursor onwards, so every page costs the same whether it is the first or the last
+def page_books(connection, sort, after=None, size=PAGE_SIZE):
+    columns = ", ".join(SORT_ORDERS[sort])
+    cursor = connection.cursor()
+    cursor.row_factory = None
+    if after is None:
+        rows = cursor.execute(
+            f"SELECT {BOOK_COLUMNS}, {columns} FROM books ORDER BY {columns} LIMIT ?", [size]
+        ).fetchall()
+    else:
+        placeholders = ", ".join("?" * len(after))
+        rows = cursor.execute(
+            f"SELECT {BOOK_COLUMNS}, {columns} FROM books WHERE ({columns}) > ({placeholders}) "
+            f"ORDER BY {columns} LIMIT ?", [*after, size]
+        ).fetchall()
+    books = [Book(*row[:len(FIELDS)]) for row in rows]
+    return books, rows[-1][len(FIELDS):] if rows else None
+
+
+# Mark a book (found by title and author in the key index) as read if it was unread and the other way round
+# Returns its new read status, or None when there is no such book
+def toggle_read(connection, title, author):
+    with connection:
+        row = connection.execute(
+            "UPDATE books SET read = NOT read WHERE title_key = ? AND author_key = ? RETURNING read",
+            [normalize_key(title), normalize_key(author)]
+        ).fetchone()
+    return None if row is None else bool(row[0])
+
+
+# Total number of books and how many of them have been read, kept up to date in book_counts
+def count_books(connection):
+    row = connection.execute("SELECT total, read FROM book_counts WHERE grouping = 'all'").fetchone()
+    return (row[0], row[1]) if row else (0, 0)
+
+
+# How books of each grouping are ordered in group_counts
+GROUPINGS = {"genre": "total DESC, value", "author": "total DESC, value", "decade": "value"}
+
+
+# Number of books and read books per genre, author or decade (grouping), as (value, total, read) rows
+# Genres and authors are given by name; largest groups first (decades oldest first);
+# read from book_counts, so the cost does not depend on the size of the library
+def group_counts(connection, grouping, limit=-1):
+    return connection.execute(
+        f"SELECT coalesce(name, value) AS value, total, read FROM book_counts WHERE grouping = ? AND total > 0 "
+        f"ORDER BY {GROUPINGS[grouping]} LIMIT ?", [grouping, limit]
+    ).fetchall()